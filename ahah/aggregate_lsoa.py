@@ -1,84 +1,156 @@
+import argparse
 import re
 import sys
 from pathlib import Path
 
-import geopandas as gpd
 import pandas as pd
-
-from ahah.common.utils import Paths
+import polars as pl
+
+from ahah.common.metrics import Metrics
+from ahah.common.utils import Paths, fmin_aligned
+
+DIST_META = ["postcode", "easting", "northing", "node_id", "nearest_poi"]
+
+
+def distance_files(out_dir: Path = Paths.OUT, batched: bool = False) -> list[Path]:
+    """
+    Lists the routing outputs of ``route.py``.
+
+    :param out_dir: Routing output directory.
+    :param batched: Read the wide ``distances.parquet`` table written by
+        ``--batched`` instead of the per-POI ``*_distances.parquet`` files.
+    :return: Distance parquet files.
+    """
+    if batched:
+        return [out_dir / "distances.parquet"]
+    return sorted(out_dir.glob("*_distances.parquet"))
+
+
+def read_dist_columns(dist_files: list[Path], ids: pl.DataFrame) -> pl.DataFrame:
+    """
+    Reads routing outputs into one column per POI type, aligned to the postcode
+    dictionary so that row ``i`` holds ``postcode_id == i``.
+
+    Outputs routed against ``postcode_nodes.parquet`` are already in dictionary
+    order and are assigned directly; anything else is joined on postcode once.
+    Both per-POI ``*_distances.parquet`` files and the wide ``--batched`` table
+    are accepted. A per-POI file's column is named by the first word of its file
+    name, ``gpp_distances.parquet`` giving ``gpp``, while wide-table columns
+    keep their names.
+
+    :param dist_files: Routing output parquet files.
+    :param ids: Postcode dictionary with ``postcode`` and ``postcode_id``.
+    :return: DataFrame with ``postcode_id`` and one column per POI type.
+    """
+    columns = {}
+    for file in dist_files:
+        df = pl.read_parquet(file).with_columns(
+            pl.col("postcode").cast(pl.String).str.replace_all(" ", "")
+        )
+        if not df["postcode"].equals(ids["postcode"]):
+            df = (
+                ids.join(df.unique("postcode"), on="postcode", how="left")
+                .sort("postcode_id")
+                .drop("postcode_id")
+            )
+        for col in df.columns:
+            if col in DIST_META or col.startswith("__index_level_"):
+                continue
+            name = re.split(r"_|\.", file.name)[0] if col == "time_weighted" else col
+            if name in columns:
+                raise ValueError(f"Duplicate distance column {name} from {file}")
+            columns[name] = df[col].cast(pl.Float64).fill_nan(None)
+    return pl.DataFrame({"postcode_id": ids["postcode_id"], **columns})
+
+
+def median_by_zone(
+    dists: pl.DataFrame, ids: pl.DataFrame, zones: pd.DataFrame, *others: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Takes the median of every postcode-level column within each zone.
+
+    Postcodes are resolved to ``postcode_id`` once per table, after which all
+    joins are on integer ids.
+
+    :param dists: Output of ``read_dist_columns``.
+    :param ids: Postcode dictionary with ``postcode`` and ``postcode_id``.
+    :param zones: Postcode to zone lookup, ``postcode`` and one zone column.
+    :param others: Further postcode-level tables to include.
+    :return: DataFrame indexed by zone code.
+    """
+    zone_col = next(col for col in zones.columns if col != "postcode")
+
+    def to_ids(df: pd.DataFrame) -> pl.DataFrame:
+        return (
+            pl.from_pandas(df)
+            .with_columns(pl.col("postcode").cast(pl.String))
+            .join(ids, on="postcode")
+            .drop("postcode")
+        )
+
+    merged = to_ids(zones).join(dists, on="postcode_id", how="left")
+    for other in others:
+        merged = merged.join(to_ids(other), on="postcode_id", how="left")
+    return (
+        merged.drop("postcode_id")
+        .group_by(zone_col)
+        .median()
+        .sort(zone_col)
+        .to_pandas()
+        .set_index(zone_col)
+    )
 
 
 def read_dists(
-    dist_files: list[Path], pcs: pd.DataFrame, ndvi: pd.DataFrame, ldc: pd.DataFrame
+    dists: pl.DataFrame,
+    ids: pl.DataFrame,
+    pcs: pd.DataFrame,
+    ndvi: pd.DataFrame,
+    ldc: pd.DataFrame,
 ) -> pd.DataFrame:
-    dfs = [
-        pd.read_parquet(file)
-        .rename(columns={"time_weighted": re.split(r"_|\.", file.name)[0]})
-        .drop(columns=["easting", "northing", "node_id"])
-        .reset_index(drop=True)
-        for file in dist_files
-    ]
-
-    merged_df = dfs[0]
-    for df in dfs[1:]:
-        merged_df = pd.merge(merged_df, df, on="postcode", how="outer")
-
-    merged_df["postcode"] = merged_df["postcode"].str.replace(" ", "")
-    merged_df = merged_df.merge(pcs, on="postcode", how="outer")
-    merged_df = merged_df.merge(ndvi, on="postcode", how="outer")
-    merged_df = merged_df.drop(columns=["postcode"]).groupby("LSOA21CD").median()
+    merged_df = median_by_zone(dists, ids, pcs, ndvi)
     merged_df["tobacconists"] = sys.maxsize
     merged_df["gambling"] = sys.maxsize
-
-    def compare_and_replace(x, y):
-        return y if pd.notna(y) and (pd.isna(x) or y < x) else x
-
-    for column in merged_df.columns:
-        if column == "LSOA21CD":
-            continue
-        if column in ldc.columns:
-            merged_df[column] = merged_df[column].combine(
-                ldc[column], compare_and_replace
-            )
-            merged_df[column].combine(ldc[column], compare_and_replace)
-    return merged_df
+    return fmin_aligned(merged_df, ldc)
 
 
 def main():
-    dist_files: list[Path] = list(Path(Paths.OUT).glob("*_distances.parquet"))
-
-    pcs: pd.DataFrame = pd.read_parquet(
-        Paths.PROCESSED / "onspd" / "all_postcodes.parquet"
-    )
-    pcs = gpd.GeoDataFrame(
-        pcs,
-        geometry=gpd.points_from_xy(pcs["easting"], pcs["northing"]),
-        crs="EPSG:27700",
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--batched",
+        action="store_true",
+        help="read the wide distances table written by route.py --batched",
     )
+    args = parser.parse_args()
+
+    with Metrics("aggregate") as metrics:
+        with metrics.step("read_distances"):
+            ids: pl.DataFrame = pl.read_parquet(
+                Paths.PROCESSED / "onspd" / "postcode_ids.parquet"
+            )
+            dist_cols: pl.DataFrame = read_dist_columns(
+                distance_files(batched=args.batched), ids
+            )
+
+        with metrics.step("read_inputs"):
+            pcs: pd.DataFrame = pd.read_parquet(
+                Paths.PROCESSED / "onspd" / "postcode_lsoa.parquet"
+            )
 
-    lsoa: gpd.GeoDataFrame = gpd.read_file(
-        "./data/raw/gov/LSOA2021/LSOA_2021_EW_BFC_V8.shp"
-    )[["LSOA21CD", "geometry"]]
-    sgiz: gpd.GeoDataFrame = gpd.read_file(
-        "./data/raw/gov/SG_DataZone/SG_DataZone_Bdry_2011.shp"
-    )[["DataZone", "geometry"]].rename(columns={"DataZone": "LSOA21CD"})
-    lsoa: gpd.GeoDataFrame = pd.concat([lsoa, sgiz])  # type: ignore
-
-    pcs = gpd.sjoin(pcs, lsoa)[["postcode", "LSOA21CD"]]
-
-    ndvi: pd.DataFrame = pd.read_csv(
-        Paths.RAW / "ndvi" / "spatia_orbit_postcode_V1_210422.csv",
-        usecols=["PCDS", "NDVI_MEDIAN"],  # type: ignore
-    ).rename(columns={"PCDS": "postcode", "NDVI_MEDIAN": "gpas"})
-    ndvi["postcode"] = ndvi["postcode"].str.replace(" ", "")
-
-    ldc: pd.DataFrame = pd.read_csv(
-        Paths.PROCESSED / "2024_08_21_CILLIANBERRAGAN_AHAHV4_LDC.csv"
-    ).set_index("LSOA21CD")
-    try:
-        dists: pd.DataFrame = read_dists(dist_files, pcs, ndvi, ldc)
-    except Exception as e:
-        raise RuntimeError(f"Error processing distance data: {e}")
+            ndvi: pd.DataFrame = pd.read_csv(
+                Paths.RAW / "ndvi" / "spatia_orbit_postcode_V1_210422.csv",
+                usecols=["PCDS", "NDVI_MEDIAN"],  # type: ignore
+            ).rename(columns={"PCDS": "postcode", "NDVI_MEDIAN": "gpas"})
+            ndvi["postcode"] = ndvi["postcode"].str.replace(" ", "")
+
+            ldc: pd.DataFrame = pd.read_csv(
+                Paths.PROCESSED / "2024_08_21_CILLIANBERRAGAN_AHAHV4_LDC.csv"
+            ).set_index("LSOA21CD")
+        with metrics.step("median_by_zone"):
+            try:
+                dists: pd.DataFrame = read_dists(dist_cols, ids, pcs, ndvi, ldc)
+            except Exception as e:
+                raise RuntimeError(f"Error processing distance data: {e}")
     air: pd.DataFrame = pd.read_csv(Paths.OUT / "air" / "AIR-LSOA21CD.csv")
     dists = dists.merge(air, on="LSOA21CD", how="left")
     dists.to_csv(Paths.OUT / "ahah" / "AHAH-V4-LSOA21CD.csv", index=False)
@@ -0,0 +1,225 @@
+import argparse
+import json
+import multiprocessing as mp
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from ahah.bench.synthetic import POLLUTANTS, SIZES, write_fixtures
+from ahah.common.metrics import measure
+from ahah.common.routing import BACKENDS
+from ahah.common.utils import Paths
+
+STAGES = [
+    "graph",
+    "snap",
+    "route",
+    "route_batched",
+    "zones",
+    "aggregate",
+    "air",
+    "index",
+]
+
+
+def stage_graph(fixtures: Path, work: Path, backend: str) -> int:
+    from ahah.common.graph import compile_graph
+
+    shutil.rmtree(work / "graph", ignore_errors=True)
+    graph, _ = compile_graph(
+        fixtures / "nodes.parquet", fixtures / "edges.parquet", work / "graph"
+    )
+    return graph.n_edges
+
+
+def stage_snap(fixtures: Path, work: Path, backend: str) -> int:
+    from ahah.common.graph import compile_graph
+    from ahah.common.routing import snap_points
+
+    graph, tree = compile_graph(
+        fixtures / "nodes.parquet", fixtures / "edges.parquet", work / "graph"
+    )
+    postcodes = pd.read_parquet(fixtures / "all_postcodes.parquet")
+    snap_points(graph, tree, postcodes).to_parquet(
+        work / "postcode_nodes.parquet", index=False
+    )
+    return len(postcodes)
+
+
+def stage_route(fixtures: Path, work: Path, backend: str) -> int:
+    from ahah.common.graph import compile_graph
+    from ahah.common.routing import RoutingSession
+
+    graph, tree = compile_graph(
+        fixtures / "nodes.parquet", fixtures / "edges.parquet", work / "graph"
+    )
+    target = pd.read_parquet(work / "postcode_nodes.parquet")
+    session = RoutingSession(graph, target, backend=backend, tree=tree)
+    pois = sorted((fixtures / "poi").glob("*.parquet"))
+    for poi in pois:
+        dist, nearest = session.route_targets(pd.read_parquet(poi))
+        session.write(
+            work / f"{poi.stem}_distances.parquet", {"time_weighted": dist}, nearest
+        )
+    return len(target) * len(pois)
+
+
+def stage_route_batched(fixtures: Path, work: Path, backend: str) -> int:
+    from ahah.common.graph import compile_graph
+    from ahah.common.routing import RoutingSession, route_files_batched
+
+    graph, tree = compile_graph(
+        fixtures / "nodes.parquet", fixtures / "edges.parquet", work / "graph"
+    )
+    target = pd.read_parquet(work / "postcode_nodes.parquet")
+    session = RoutingSession(graph, target, backend=backend, tree=tree)
+    pois = sorted((fixtures / "poi").glob("*.parquet"))
+    # not matched by the ``*_distances.parquet`` glob of the aggregate stage
+    route_files_batched(session, pois, work / "distances.parquet")
+    return len(target) * len(pois)
+
+
+def stage_zones(fixtures: Path, work: Path, backend: str) -> int:
+    from ahah.common.zones import postcode_zone_lookup
+
+    outfile = work / "postcode_lsoa.parquet"
+    outfile.unlink(missing_ok=True)
+    # ``Paths.RAW / path`` leaves an absolute boundary path as it is
+    lookup = postcode_zone_lookup(
+        {str((fixtures / "zones.gpkg").resolve()): "LSOA21CD"},
+        "LSOA21CD",
+        outfile,
+        postcodes_path=fixtures / "all_postcodes.parquet",
+    )
+    return len(lookup)
+
+
+def stage_aggregate(fixtures: Path, work: Path, backend: str) -> int:
+    from ahah.aggregate_lsoa import median_by_zone, read_dist_columns
+
+    ids = (
+        pl.read_parquet(fixtures / "all_postcodes.parquet", columns=["postcode"])
+        .with_columns(pl.col("postcode").cast(pl.String))
+        .with_row_index("postcode_id")
+        .with_columns(pl.col("postcode_id").cast(pl.Int32))
+        .select("postcode", "postcode_id")
+    )
+    dists = read_dist_columns(sorted(work.glob("*_distances.parquet")), ids)
+    zones = pd.read_parquet(work / "postcode_lsoa.parquet")
+    median_by_zone(dists, ids, zones).to_csv(work / "aggregate.csv")
+    return len(dists)
+
+
+def stage_air(fixtures: Path, work: Path, backend: str) -> int:
+    import geopandas as gpd
+
+    from ahah.air_lsoa import GRID_SIZE, METHOD
+    from ahah.common.air import cell_zones, interpolate_grid, make_grid, zonal_mean
+    from ahah.common.utils import clean_air
+
+    zones = gpd.read_file(fixtures / "zones.gpkg")
+    airs = {
+        col: clean_air(path=fixtures / "air" / f"{col}.csv", col=col)
+        for col in POLLUTANTS
+    }
+    grid_x, grid_y = make_grid(list(airs.values()), grid_size=GRID_SIZE)
+    cell_idx, zone_idx = cell_zones(grid_x, grid_y, GRID_SIZE, zones)
+    grids = interpolate_grid(airs, grid_x=grid_x, grid_y=grid_y, method=METHOD)
+    zonal_mean(grids, cell_idx, zone_idx, zones, "LSOA21CD").to_csv(
+        work / "air.csv", index=False
+    )
+    return len(grid_x) * len(airs)
+
+
+def stage_index(fixtures: Path, work: Path, backend: str) -> int:
+    from ahah.create_index import DOMAINS, process
+
+    # indicators the synthetic fixtures do not route are drawn at random, one
+    # row per zone of the aggregate stage
+    agg = pd.read_csv(work / "aggregate.csv")
+    rng = np.random.default_rng(0)
+    idx = pd.DataFrame(
+        {
+            ind: rng.gamma(2.0, 5.0, len(agg))
+            for _, inds in DOMAINS.values()
+            for ind in inds
+        }
+    )
+    idx.insert(0, "LSOA21CD", agg["LSOA21CD"])
+    process(idx, "ah4").to_csv(work / "index.csv", index=False)
+    return len(idx)
+
+
+def _measure(stage: str, fixtures: Path, work: Path, backend: str) -> dict:
+    # runs in a fresh process, so imports are already paid for and the peak
+    # belongs to this stage alone
+    with measure() as record:
+        items = globals()[f"stage_{stage}"](fixtures, work, backend)
+    return {
+        "stage": stage,
+        "items": items,
+        "items_per_s": items / record["wall_s"],
+        **record,
+    }
+
+
+def run_stage(stage: str, fixtures: Path, work: Path, backend: str) -> dict:
+    """
+    Runs one stage in a fresh spawned process and measures it.
+
+    Stage outputs are left in ``work`` for the stages that read them, so stages
+    run in ``STAGES`` order. Pools started by a stage count towards
+    ``child_cpu_s`` but not towards the peak RSS.
+
+    :param stage: One of ``STAGES``.
+    :param fixtures: Directory written by ``write_fixtures``.
+    :param work: Directory for stage outputs, read by later stages.
+    :param backend: Routing backend.
+    :return: Items processed, throughput and the ``measure`` record.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+        return pool.submit(_measure, stage, fixtures, work, backend).result()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", choices=SIZES, default="10k")
+    parser.add_argument("--kind", choices=["grid", "planar"], default="grid")
+    parser.add_argument("--backend", choices=BACKENDS, default="scipy")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    bench_dir = Paths.DATA / "bench" / f"{args.size}_{args.kind}"
+    fixtures, work = bench_dir / "fixtures", bench_dir / "work"
+    if not (fixtures / "nodes.parquet").exists():
+        write_fixtures(args.size, fixtures, kind=args.kind, seed=args.seed)
+    work.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for stage in args.stages:
+        results.append(run_stage(stage, fixtures, work, args.backend))
+        print(
+            "{stage:<13} {items:>12,} items {wall_s:>9.2f}s wall {cpu_s:>9.2f}s cpu "
+            "{child_cpu_s:>9.2f}s child cpu "
+            "{items_per_s:>14,.0f}/s {peak_rss_mb:>9.0f} MB peak".format(**results[-1])
+        )
+    (bench_dir / f"results_{args.backend}.json").write_text(
+        json.dumps(
+            {
+                "size": args.size,
+                "kind": args.kind,
+                "backend": args.backend,
+                "stages": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+# named fixture sizes, in road nodes
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "3m": 3_000_000}
+NODE_SPACING = 100.0
+AIR_SPACING = 1000.0
+# roughly the national ratios: 1.7m postcodes and ~40 postcodes per LSOA to
+# 3.2m road nodes, and one GP practice per ~400 nodes
+POSTCODES_PER_NODE = 0.5
+POSTCODES_PER_ZONE = 40
+POI_DENSITY = {"gpp": 1 / 400, "pharmacies": 1 / 300, "bluespace": 1 / 10}
+POLLUTANTS = ["no22022", "so22022", "pm102022g"]
+
+
+def road_graph(
+    n_nodes: int, kind: str = "grid", seed: int = 0
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Generates a road network in the ``nodes.parquet`` / ``edges.parquet`` schema.
+
+    ``grid`` jitters a square lattice and drops a tenth of its links, ``planar``
+    triangulates random points and drops the longest links. Edge weights are
+    travel times at a random speed per link.
+
+    :param n_nodes: Approximate number of nodes.
+    :param kind: ``grid`` or ``planar``.
+    :param seed: Random seed.
+    :return: ``nodes`` and ``edges`` DataFrames.
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n_nodes)))
+    if kind == "grid":
+        row, col = np.divmod(np.arange(side * side), side)
+        coords = np.column_stack([col, row]) * NODE_SPACING
+        coords += rng.normal(0, NODE_SPACING / 5, coords.shape)
+        right = np.flatnonzero(col < side - 1)
+        down = np.flatnonzero(row < side - 1)
+        start = np.concatenate([right, down])
+        end = np.concatenate([right + 1, down + side])
+        keep = rng.random(len(start)) > 0.1
+        start, end = start[keep], end[keep]
+    elif kind == "planar":
+        from scipy.spatial import Delaunay
+
+        coords = rng.uniform(0, side * NODE_SPACING, (side * side, 2))
+        simplices = Delaunay(coords).simplices
+        pairs = np.sort(
+            np.vstack(
+                [simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]]
+            ),
+            axis=1,
+        )
+        start, end = np.unique(pairs, axis=0).T
+        length = np.linalg.norm(coords[start] - coords[end], axis=1)
+        keep = length < np.quantile(length, 0.9)
+        start, end = start[keep], end[keep]
+    else:
+        raise ValueError(f"Unknown graph kind: {kind}")
+
+    node_ids = np.sort(rng.choice(np.iinfo(np.int32).max, len(coords), replace=False))
+    length = np.linalg.norm(coords[start] - coords[end], axis=1)
+    # metres per minute for 20-60 mph roads
+    speed = rng.choice([536.0, 804.0, 1072.0, 1609.0], len(start))
+    nodes = pd.DataFrame(
+        {"node_id": node_ids, "easting": coords[:, 0], "northing": coords[:, 1]}
+    )
+    edges = pd.DataFrame(
+        {
+            "start_node": node_ids[start],
+            "end_node": node_ids[end],
+            "time_weighted": length / speed,
+        }
+    )
+    return nodes, edges
+
+
+def points_near(
+    nodes: pd.DataFrame, n: int, rng: np.random.Generator
+) -> tuple[np.ndarray, np.ndarray]:
+    # scattered around random road nodes, as postcodes and POIs are
+    idx = rng.integers(len(nodes), size=n)
+    jitter = rng.normal(0, NODE_SPACING / 2, (n, 2))
+    return (
+        nodes["easting"].to_numpy()[idx] + jitter[:, 0],
+        nodes["northing"].to_numpy()[idx] + jitter[:, 1],
+    )
+
+
+def postcodes(nodes: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates postcode centroids in the ``all_postcodes.parquet`` schema.
+
+    :param nodes: Road nodes to scatter postcodes around.
+    :param seed: Random seed.
+    :return: DataFrame with ``postcode``, ``easting`` and ``northing``, sorted by
+        postcode.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(len(nodes) * POSTCODES_PER_NODE)
+    easting, northing = points_near(nodes, n, rng)
+    return pd.DataFrame(
+        {
+            "postcode": np.char.add("SY", np.arange(n).astype(str)),
+            "easting": easting.round().astype(np.int32),
+            "northing": northing.round().astype(np.int32),
+        }
+    ).sort_values("postcode", ignore_index=True)
+
+
+def pois(nodes: pd.DataFrame, seed: int = 0) -> dict[str, pd.DataFrame]:
+    """
+    Generates one POI set per entry in ``POI_DENSITY``.
+
+    :param nodes: Road nodes to scatter POIs around.
+    :param seed: Random seed.
+    :return: POI name mapped to a DataFrame with ``easting`` and ``northing``.
+    """
+    rng = np.random.default_rng(seed)
+    out = {}
+    for name, density in POI_DENSITY.items():
+        easting, northing = points_near(nodes, max(1, int(len(nodes) * density)), rng)
+        out[name] = pd.DataFrame({"easting": easting, "northing": northing})
+    return out
+
+
+def zones(nodes: pd.DataFrame, n_postcodes: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """
+    Generates LSOA-like polygons tiling the network extent.
+
+    Zones are grid rectangles whose interior corners are jittered, so zones
+    are irregular quadrilaterals that still tile without gaps.
+
+    :param nodes: Road nodes giving the extent.
+    :param n_postcodes: Number of postcodes, to size zones like LSOAs.
+    :param seed: Random seed.
+    :return: GeoDataFrame with ``LSOA21CD`` and ``geometry`` in EPSG:27700.
+    """
+    rng = np.random.default_rng(seed)
+    side = max(1, int(np.sqrt(n_postcodes / POSTCODES_PER_ZONE)))
+    # wide enough to hold postcodes scattered beyond the outermost nodes
+    pad = 5 * NODE_SPACING
+    x0, y0 = nodes["easting"].min() - pad, nodes["northing"].min() - pad
+    x1, y1 = nodes["easting"].max() + pad, nodes["northing"].max() + pad
+    xs = np.linspace(x0, x1, side + 1)
+    ys = np.linspace(y0, y1, side + 1)
+    cx, cy = np.meshgrid(xs, ys)
+    inner = np.zeros(cx.shape, dtype=bool)
+    inner[1:-1, 1:-1] = True
+    step = min(xs[1] - xs[0], ys[1] - ys[0])
+    cx[inner] += rng.uniform(-step / 4, step / 4, inner.sum())
+    cy[inner] += rng.uniform(-step / 4, step / 4, inner.sum())
+    i, j = np.divmod(np.arange(side * side), side)
+    corners = np.stack(
+        [
+            np.stack([cx[i, j], cy[i, j]], axis=-1),
+            np.stack([cx[i, j + 1], cy[i, j + 1]], axis=-1),
+            np.stack([cx[i + 1, j + 1], cy[i + 1, j + 1]], axis=-1),
+            np.stack([cx[i + 1, j], cy[i + 1, j]], axis=-1),
+        ],
+        axis=1,
+    )
+    return gpd.GeoDataFrame(
+        {"LSOA21CD": np.char.add("E01", np.arange(side * side).astype(str))},
+        geometry=shapely.polygons(corners),
+        crs="EPSG:27700",
+    )
+
+
+def write_air_csv(nodes: pd.DataFrame, col: str, path: Path, seed: int = 0) -> None:
+    """
+    Writes a DEFRA background map CSV: five header lines, then 1 km cell
+    centroids with the pollutant column and some ``MISSING`` cells.
+
+    :param nodes: Road nodes giving the extent.
+    :param col: Pollutant column name, e.g. ``no22022``.
+    :param path: CSV path.
+    :param seed: Random seed.
+    """
+    rng = np.random.default_rng(seed)
+    xs = np.arange(0, nodes["easting"].max() + AIR_SPACING, AIR_SPACING) + 500
+    ys = np.arange(0, nodes["northing"].max() + AIR_SPACING, AIR_SPACING) + 500
+    x, y = (a.ravel() for a in np.meshgrid(xs, ys))
+    values = (10 + 5 * np.sin(x / 20_000) * np.cos(y / 20_000)).round(3).astype(str)
+    values[rng.random(len(values)) < 0.01] = "MISSING"
+    air = pd.DataFrame(
+        {"ukgridcode": np.arange(len(x)), "x": x.astype(int), "y": y.astype(int)}
+    )
+    air[col] = values
+    with open(path, "w") as f:
+        f.write("Synthetic background map\n" * 5)
+        air.to_csv(f, index=False)
+
+
+def write_fixtures(size: str, out_dir: Path, kind: str = "grid", seed: int = 0):
+    """
+    Writes a complete synthetic fixture set to ``out_dir``.
+
+    Layout: ``nodes.parquet``, ``edges.parquet``, ``all_postcodes.parquet``,
+    ``zones.gpkg``, ``poi/<name>.parquet`` and ``air/<pollutant>.csv``.
+
+    :param size: Key of ``SIZES``.
+    :param out_dir: Directory to write to.
+    :param kind: ``grid`` or ``planar`` road network.
+    :param seed: Random seed.
+    """
+    (out_dir / "poi").mkdir(parents=True, exist_ok=True)
+    (out_dir / "air").mkdir(exist_ok=True)
+    nodes, edges = road_graph(SIZES[size], kind=kind, seed=seed)
+    nodes.to_parquet(out_dir / "nodes.parquet", index=False)
+    edges.to_parquet(out_dir / "edges.parquet", index=False)
+    pcs = postcodes(nodes, seed=seed)
+    pcs.to_parquet(out_dir / "all_postcodes.parquet", index=False)
+    zones(nodes, len(pcs), seed=seed).to_file(out_dir / "zones.gpkg")
+    for name, poi in pois(nodes, seed=seed).items():
+        poi.to_parquet(out_dir / "poi" / f"{name}.parquet", index=False)
+    for i, col in enumerate(POLLUTANTS):
+        write_air_csv(nodes, col, out_dir / "air" / f"{col}.csv", seed=seed + i)
@@ -0,0 +1,24 @@
+import argparse
+
+from ahah.common.poi_index import PoiIndex
+from ahah.common.utils import Paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--poi", nargs="+", help="POI files in data/processed to index, all by default"
+    )
+    args = parser.parse_args()
+
+    sources = {
+        file.stem: file
+        for file in sorted(Paths.PROCESSED.glob("*.parquet"))
+        if args.poi is None or file.stem in args.poi
+    }
+    index = PoiIndex.build(sources)
+    print(f"POI index covers {', '.join(index.categories)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import argparse
+
+import pandas as pd
+
+from ahah.common.graph import compile_graph
+from ahah.common.routing import SAMPLE_BBOX, check_backends
+from ahah.common.utils import Paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--poi", default="gpp")
+    parser.add_argument("--bbox", type=float, nargs=4, default=SAMPLE_BBOX)
+    args = parser.parse_args()
+
+    postcodes = pd.read_parquet(Paths.PROCESSED / "onspd" / "all_postcodes.parquet")
+    graph, _ = compile_graph()
+    source = pd.read_parquet(Paths.PROCESSED / f"{args.poi}.parquet").dropna(
+        subset=["easting", "northing"]
+    )
+    diff = check_backends(graph, postcodes, source, bbox=tuple(args.bbox))
+    print(f"scipy matches networkx for {args.poi}, max abs difference {diff:.3g}")
+
+
+if __name__ == "__main__":
+    main()
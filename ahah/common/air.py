@@ -0,0 +1,215 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.interpolate import LinearNDInterpolator
+from scipy.spatial import Delaunay, cKDTree
+
+METHODS = ["nearest", "linear"]
+# pooled neighbours searched for the nearest point holding each pollutant
+K_NEAREST = 16
+
+
+def make_grid(
+    airs: list[pd.DataFrame], grid_size: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the lower-left corners of a regular grid covering every air table.
+
+    :param airs: Air quality tables with ``x`` and ``y`` columns.
+    :param grid_size: Cell size in metres.
+    :return: Flattened ``grid_x`` and ``grid_y`` arrays.
+    """
+    max_x = max(air["x"].max() for air in airs)
+    max_y = max(air["y"].max() for air in airs)
+    grid_x, grid_y = np.mgrid[0:max_x:grid_size, 0:max_y:grid_size]
+    return grid_x.ravel(), grid_y.ravel()
+
+
+def _pooled_points(
+    airs: dict[str, pd.DataFrame],
+) -> tuple[np.ndarray, dict[str, np.ndarray], dict[str, np.ndarray]]:
+    # every distinct point of every table, with each table's value and row at it
+    xy = pd.concat([air[["x", "y"]] for air in airs.values()]).drop_duplicates(
+        ignore_index=True
+    )
+    pooled = pd.MultiIndex.from_frame(xy)
+    values, rows = {}, {}
+    for col, air in airs.items():
+        row = pd.MultiIndex.from_frame(air[["x", "y"]]).get_indexer(pooled)
+        value = air[col].to_numpy(np.float64)[np.maximum(row, 0)]
+        value[row < 0] = np.nan
+        rows[col] = np.where(np.isnan(value), -1, row)
+        values[col] = value
+    return xy.astype("int").to_numpy(), values, rows
+
+
+def _pick_nearest(
+    dist: np.ndarray, idx: np.ndarray, row: np.ndarray, complete: bool
+) -> tuple[np.ndarray, np.ndarray]:
+    # closest neighbour holding a value, ties going to the lowest table row;
+    # without ``complete`` a cell is only resolved if its k-th neighbour is
+    # further away, as a nearer or equidistant point could lie beyond it
+    neighbour_row = row[idx]
+    valid_dist = np.where(neighbour_row >= 0, dist, np.inf)
+    best = valid_dist.min(axis=1)
+    tied_row = np.where(
+        valid_dist == best[:, None], neighbour_row, np.iinfo(np.int64).max
+    )
+    pick = idx[np.arange(len(idx)), tied_row.argmin(axis=1)]
+    pick[np.isinf(best)] = -1
+    resolved = np.full(len(idx), True) if complete else best < dist[:, -1]
+    return pick, resolved
+
+
+def _interpolate_nearest(
+    points: np.ndarray,
+    values: dict[str, np.ndarray],
+    rows: dict[str, np.ndarray],
+    xi: np.ndarray,
+) -> dict[str, np.ndarray]:
+    tree = cKDTree(points)
+    k = min(K_NEAREST, tree.n)
+    # a sequence of k keeps the results 2D even for a single neighbour
+    dist, idx = tree.query(xi, k=np.arange(1, k + 1), workers=-1)
+    grid_z = {}
+    for col, value in values.items():
+        pick, resolved = _pick_nearest(dist, idx, rows[col], k == tree.n)
+        # cells whose neighbours are all missing for this pollutant are rare,
+        # so only they are queried again with a widening k
+        wider = k
+        while not resolved.all():
+            todo = np.flatnonzero(~resolved)
+            wider = min(wider * 4, tree.n)
+            todo_dist, todo_idx = tree.query(
+                xi[todo], k=np.arange(1, wider + 1), workers=-1
+            )
+            pick[todo], resolved[todo] = _pick_nearest(
+                todo_dist, todo_idx, rows[col], wider == tree.n
+            )
+        grid_z[col] = np.where(pick >= 0, value[np.maximum(pick, 0)], np.nan)
+    return grid_z
+
+
+def _interpolate_linear(
+    points: np.ndarray, values: dict[str, np.ndarray], xi: np.ndarray
+) -> dict[str, np.ndarray]:
+    tri = Delaunay(points)
+    cols = list(values)
+    pooled_z = LinearNDInterpolator(tri, np.column_stack(list(values.values())))(xi)
+    inside = tri.find_simplex(xi) >= 0
+    indptr, neighbours = tri.vertex_neighbor_vertices
+    owner = np.repeat(np.arange(len(points)), np.diff(indptr))
+    grid_z = {}
+    for i, col in enumerate(cols):
+        grid_z[col] = pooled_z[:, i]
+        missing = np.isnan(values[col])
+        # NaN inside the pooled hull means the cell's triangle has a missing
+        # vertex; removing points only re-triangulates the triangles around
+        # them, from the points they touched
+        gap = inside & np.isnan(grid_z[col])
+        if not gap.any():
+            continue
+        around = np.zeros(len(points), dtype=bool)
+        around[neighbours[missing[owner]]] = True
+        around &= ~missing
+        if around.sum() >= 3:
+            grid_z[col][gap] = LinearNDInterpolator(
+                points[around], values[col][around]
+            )(xi[gap])
+    return grid_z
+
+
+def interpolate_grid(
+    airs: dict[str, pd.DataFrame],
+    grid_x: np.ndarray,
+    grid_y: np.ndarray,
+    method: str,
+) -> dict[str, np.ndarray]:
+    """
+    Interpolates every pollutant onto the grid from one shared spatial structure.
+
+    The points of all pollutants are pooled and a single KD-tree (``nearest``)
+    or Delaunay triangulation (``linear``) is built over them, so grids that
+    differ only by a few ``MISSING`` cells do not each build their own. Gaps
+    are then handled per pollutant. ``nearest`` takes the closest of the
+    ``K_NEAREST`` pooled neighbours holding a value, querying further for the
+    rare cells where none do, and resolves equidistant points to the lowest
+    row of the pollutant's own table. ``linear`` re-evaluates cells in a
+    triangle with a missing vertex on a triangulation of the points around
+    the gaps, which matches triangulating the pollutant alone except where
+    cocircular points, as on a regular grid, admit either diagonal.
+
+    :param airs: Air quality tables with ``x``, ``y`` and the named column.
+    :param grid_x: Cell lower-left eastings.
+    :param grid_y: Cell lower-left northings.
+    :param method: ``nearest`` or ``linear``.
+    :return: Gridded values by column, ``NaN`` beyond each pollutant's extent.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown interpolation method: {method}")
+
+    points, values, rows = _pooled_points(airs)
+    xi = np.column_stack([grid_x, grid_y])
+    if method == "nearest":
+        grid_z = _interpolate_nearest(points, values, rows, xi)
+    else:
+        grid_z = _interpolate_linear(points, values, xi)
+
+    out = {}
+    for col, air in airs.items():
+        # cells beyond this pollutant's own extent were never part of its grid
+        out[col] = np.where(
+            (grid_x >= air["x"].max()) | (grid_y >= air["y"].max()),
+            np.nan,
+            grid_z[col],
+        )
+    return out
+
+
+def cell_zones(
+    grid_x: np.ndarray, grid_y: np.ndarray, grid_size: int, zones: gpd.GeoDataFrame
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Indexes which zones each grid cell intersects.
+
+    Cell squares are built in one vectorised ``shapely.box`` call and queried
+    against the zones' spatial index, so the index can be reused for every
+    pollutant.
+
+    :param grid_x: Cell lower-left eastings.
+    :param grid_y: Cell lower-left northings.
+    :param grid_size: Cell size in metres.
+    :param zones: Zone polygons.
+    :return: Paired ``(cell_idx, zone_idx)`` arrays, one entry per intersection.
+    """
+    cells = shapely.box(grid_x, grid_y, grid_x + grid_size, grid_y + grid_size)
+    cell_idx, zone_idx = zones.sindex.query(cells, predicate="intersects")
+    return cell_idx, zone_idx
+
+
+def zonal_mean(
+    values: dict[str, np.ndarray],
+    cell_idx: np.ndarray,
+    zone_idx: np.ndarray,
+    zones: gpd.GeoDataFrame,
+    zone_col: str,
+) -> pd.DataFrame:
+    """
+    Averages every gridded value column over the cells intersecting each zone.
+
+    :param values: Gridded values by column name, ``NaN`` outside a grid.
+    :param cell_idx: Cell side of the ``cell_zones`` index.
+    :param zone_idx: Zone side of the ``cell_zones`` index.
+    :param zones: Zone polygons the index was built against.
+    :param zone_col: Zone code column.
+    :return: DataFrame with ``zone_col`` and one mean column per value column,
+        with a row for every zone.
+    """
+    means = (
+        pd.DataFrame({col: grid[cell_idx] for col, grid in values.items()})
+        .assign(**{zone_col: zones[zone_col].to_numpy()[zone_idx]})
+        .groupby(zone_col)
+        .mean()
+    )
+    return zones[[zone_col]].join(means, on=zone_col).reset_index(drop=True)
@@ -0,0 +1,118 @@
+import json
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import polars as pl
+
+from ahah.common.utils import Config, Paths
+
+# CKAN's default ``ckan.datastore.search.rows_max``
+PAGE_SIZE = 32_000
+WORKERS = 8
+RETRIES = 3
+TIMEOUT = 60
+
+
+def _get_json(url: str, retries: int = RETRIES) -> dict:
+    for attempt in range(retries):
+        try:
+            with urllib.request.urlopen(url, timeout=TIMEOUT) as response:
+                return json.loads(response.read().decode())
+        except OSError as e:
+            if attempt == retries - 1:
+                raise RuntimeError(f"Error fetching data from URL {url}: {e}")
+            time.sleep(2**attempt)
+    raise AssertionError("unreachable")
+
+
+def _resource_version(base_url: str, resource_id: str) -> str | None:
+    # datastore_search sits next to resource_show under the same action API
+    url = (
+        base_url.rsplit("/", 1)[0]
+        + "/resource_show?"
+        + urllib.parse.urlencode({"id": resource_id})
+    )
+    try:
+        resource = _get_json(url)["result"]
+    except (RuntimeError, KeyError):
+        return None
+    return resource.get("last_modified") or resource.get("metadata_modified")
+
+
+def _fetch_page(
+    base_url: str, resource_id: str, limit: int, offset: int, cache: Path
+) -> dict:
+    page_file = cache / f"{offset}.json"
+    if page_file.exists():
+        return json.loads(page_file.read_text())
+    query = urllib.parse.urlencode(
+        {"resource_id": resource_id, "limit": limit, "offset": offset}
+    )
+    result = _get_json(f"{base_url}?{query}")["result"]
+    page = {"total": result["total"], "records": result["records"]}
+    # write then rename so an interrupted run never leaves a truncated page
+    tmp = page_file.with_suffix(".tmp")
+    tmp.write_text(json.dumps(page))
+    tmp.replace(page_file)
+    return page
+
+
+def fetch_records(
+    resource_id: str,
+    base_url: str = Config.NHS_SCOT_URL,
+    page_size: int = PAGE_SIZE,
+    workers: int = WORKERS,
+    cache_dir: Path = Paths.RAW / "nhs" / "ckan",
+) -> pl.DataFrame:
+    """
+    Downloads every record of a CKAN datastore resource.
+
+    The first page gives the total, after which the remaining pages are fetched
+    concurrently by a bounded thread pool. Raw pages are cached under
+    ``cache_dir`` as they arrive, so an interrupted run resumes where it
+    stopped and a rerun makes no datastore requests. The cache is discarded
+    when the resource's modification time reported by ``resource_show`` or the
+    page size changes; if the modification time cannot be read, cached pages are
+    trusted.
+
+    :param resource_id: CKAN resource id.
+    :param base_url: ``datastore_search`` endpoint, e.g. a local stand-in server.
+    :param page_size: Records per request.
+    :param workers: Maximum concurrent requests.
+    :param cache_dir: Directory holding one page cache per resource.
+    :return: DataFrame of all records in datastore order.
+    """
+    cache = cache_dir / resource_id
+    cache.mkdir(parents=True, exist_ok=True)
+    meta_file = cache / "meta.json"
+    meta = {
+        "base_url": base_url,
+        "page_size": page_size,
+        "version": _resource_version(base_url, resource_id),
+    }
+    if meta_file.exists():
+        cached = json.loads(meta_file.read_text())
+        if meta["version"] is None and cached["base_url"] == base_url:
+            meta["version"] = cached["version"]
+        if cached != meta:
+            for page_file in cache.glob("*.json"):
+                page_file.unlink()
+    meta_file.write_text(json.dumps(meta, indent=2))
+
+    first = _fetch_page(base_url, resource_id, page_size, 0, cache)
+    offsets = range(page_size, first["total"], page_size)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pages = list(
+            pool.map(
+                lambda offset: _fetch_page(
+                    base_url, resource_id, page_size, offset, cache
+                ),
+                offsets,
+            )
+        )
+    return pl.DataFrame(
+        [record for page in [first, *pages] for record in page["records"]]
+    )
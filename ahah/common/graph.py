@@ -0,0 +1,198 @@
+import json
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+
+from ahah.common.utils import Paths, file_signature
+
+GRAPH_ARRAYS = ["node_ids", "coords", "indptr", "indices", "weights"]
+
+
+@dataclass
+class RoadGraph:
+    """
+    Undirected road network stored as CSR adjacency arrays.
+
+    Row ``i`` of the CSR arrays holds the neighbours of node ``node_ids[i]``, so
+    internal node indices are positions in ``node_ids`` rather than the ids used
+    by ``nodes.parquet``.
+    """
+
+    node_ids: np.ndarray
+    coords: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    path: Path | None = None
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    @property
+    def key(self) -> str | None:
+        """
+        Identifies the source parquets of a graph opened from the compiled cache
+        by their MD5s, so touching an unchanged file keeps the key. ``None`` for
+        any other graph, which can never be matched.
+        """
+        if self.path is None or not (self.path / "manifest.json").exists():
+            return None
+        manifest = json.loads((self.path / "manifest.json").read_text())
+        return json.dumps(
+            {name: entry["md5"] for name, entry in sorted(manifest.items())}
+        )
+
+    @classmethod
+    def from_frames(cls, nodes: pd.DataFrame, edges: pd.DataFrame) -> "RoadGraph":
+        """
+        Builds the CSR graph from the OS Open Road ``nodes`` and ``edges`` tables.
+
+        Parallel edges are collapsed to the one with the lowest ``time_weighted``
+        and self loops are dropped.
+
+        :param nodes: DataFrame with ``node_id``, ``easting`` and ``northing``.
+        :param edges: DataFrame with ``start_node``, ``end_node`` and ``time_weighted``.
+        :return: RoadGraph.
+        """
+        nodes = nodes.sort_values("node_id")
+        node_ids = nodes["node_id"].to_numpy()
+        coords = nodes[["easting", "northing"]].to_numpy(dtype=np.float64)
+
+        start = np.searchsorted(node_ids, edges["start_node"].to_numpy())
+        end = np.searchsorted(node_ids, edges["end_node"].to_numpy())
+        weight = edges["time_weighted"].to_numpy(dtype=np.float64)
+
+        u = np.concatenate([start, end])
+        v = np.concatenate([end, start])
+        w = np.concatenate([weight, weight])
+        keep = u != v
+        u, v, w = u[keep], v[keep], w[keep]
+
+        order = np.lexsort((w, v, u))
+        u, v, w = u[order], v[order], w[order]
+        first = np.ones(len(u), dtype=bool)
+        first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        u, v, w = u[first], v[first], w[first]
+
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(u, minlength=len(node_ids)), out=indptr[1:])
+        return cls(
+            node_ids=node_ids,
+            coords=coords,
+            indptr=indptr,
+            indices=v.astype(np.int32),
+            weights=w,
+        )
+
+    def to_csr(self) -> csr_matrix:
+        return csr_matrix(
+            (self.weights, self.indices, self.indptr),
+            shape=(self.n_nodes, self.n_nodes),
+        )
+
+    def subgraph(self, mask: np.ndarray) -> "RoadGraph":
+        """
+        Keeps only the nodes selected by ``mask`` and the edges between them.
+
+        :param mask: Boolean array of length ``n_nodes``.
+        :return: RoadGraph with internal indices renumbered.
+        """
+        remap = np.full(self.n_nodes, -1, dtype=np.int64)
+        remap[mask] = np.arange(mask.sum())
+        row = np.repeat(np.arange(self.n_nodes), np.diff(self.indptr))
+        keep = mask[row] & mask[self.indices]
+        indptr = np.zeros(mask.sum() + 1, dtype=np.int64)
+        np.cumsum(np.bincount(remap[row[keep]], minlength=mask.sum()), out=indptr[1:])
+        return RoadGraph(
+            node_ids=self.node_ids[mask],
+            coords=self.coords[mask],
+            indptr=indptr,
+            indices=remap[self.indices[keep]].astype(np.int32),
+            weights=self.weights[keep],
+        )
+
+    def save(self, path: Path) -> None:
+        """
+        Writes each CSR array to ``path`` as a separate ``.npy`` file.
+
+        :param path: Directory to write to, created if missing.
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        for field in GRAPH_ARRAYS:
+            np.save(path / f"{field}.npy", getattr(self, field))
+
+    @classmethod
+    def load(cls, path: Path, mmap_mode: str | None = "r") -> "RoadGraph":
+        """
+        Opens a graph written by ``save``, memory-mapped by default so the arrays
+        are shared between processes through the page cache rather than copied.
+
+        :param path: Directory written by ``save``.
+        :param mmap_mode: Passed to ``np.load``; ``None`` reads into memory.
+        :return: RoadGraph.
+        """
+        return cls(
+            **{
+                field: np.load(path / f"{field}.npy", mmap_mode=mmap_mode)
+                for field in GRAPH_ARRAYS
+            },
+            path=path,
+        )
+
+
+def compile_graph(
+    nodes_path: Path = Paths.OPROAD / "nodes.parquet",
+    edges_path: Path = Paths.OPROAD / "edges.parquet",
+    cache_dir: Path = Paths.GRAPH,
+) -> tuple[RoadGraph, cKDTree]:
+    """
+    Opens the compiled road graph, rebuilding it if the source parquets changed.
+
+    The cache directory holds one memory-mappable ``.npy`` file per CSR array, a
+    pickled KD-tree over the node coordinates and a ``manifest.json`` with the
+    MD5, size and modification time of ``nodes.parquet`` and ``edges.parquet``.
+    Files are only re-hashed when their size or modification time changed, and
+    the cache is rebuilt when an MD5 differs. The manifest is written last, so an
+    interrupted build is treated as stale.
+
+    :param nodes_path: Path to ``nodes.parquet``.
+    :param edges_path: Path to ``edges.parquet``.
+    :param cache_dir: Directory for the compiled graph.
+    :return: Memory-mapped RoadGraph and its node KD-tree.
+    """
+    manifest = cache_dir / "manifest.json"
+    saved = json.loads(manifest.read_text()) if manifest.exists() else {}
+    hashes = {
+        path.name: file_signature(path, saved.get(path.name))
+        for path in (nodes_path, edges_path)
+    }
+    if saved and all(
+        isinstance(saved.get(name), dict) and saved[name]["md5"] == entry["md5"]
+        for name, entry in hashes.items()
+    ):
+        if saved != hashes:
+            # touched but unchanged, recorded so the next open skips hashing
+            manifest.write_text(json.dumps(hashes, indent=2))
+        with open(cache_dir / "tree.pkl", "rb") as f:
+            return RoadGraph.load(cache_dir), pickle.load(f)
+
+    manifest.unlink(missing_ok=True)
+    graph = RoadGraph.from_frames(
+        pd.read_parquet(nodes_path), pd.read_parquet(edges_path)
+    )
+    tree = cKDTree(graph.coords)
+    graph.save(cache_dir)
+    with open(cache_dir / "tree.pkl", "wb") as f:
+        pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+    manifest.write_text(json.dumps(hashes, indent=2))
+    return RoadGraph.load(cache_dir), tree
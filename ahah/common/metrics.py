@@ -0,0 +1,124 @@
+import json
+import resource
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from ahah.common.utils import Paths
+
+# peak of the enclosing ``measure`` blocks, innermost last
+_open_peaks: list[float] = []
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM is per process image, whereas ``ru_maxrss`` survives exec and so
+    # includes the parent's peak in spawned workers
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reset_peak_rss() -> None:
+    # Linux resets VmHWM to the current RSS on writing 5 to clear_refs
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+@contextmanager
+def measure() -> Iterator[dict]:
+    """
+    Measures the enclosed block, filling the yielded dict on exit.
+
+    Records wall and CPU time, CPU time of child processes reaped during the
+    block (pools that are shut down inside it) and peak RSS. On Linux the peak is
+    reset on entry, so it covers this block alone; elsewhere it is the process
+    peak so far. Blocks may be nested, an outer block's peak including its inner
+    ones. Callers may add their own keys, such as counters, to the dict.
+
+    :return: Dict gaining ``wall_s``, ``cpu_s``, ``child_cpu_s`` and
+        ``peak_rss_mb``.
+    """
+    if _open_peaks:
+        _open_peaks[-1] = max(_open_peaks[-1], _peak_rss_mb())
+    _open_peaks.append(0.0)
+    _reset_peak_rss()
+    record = {}
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        peak = max(_open_peaks.pop(), _peak_rss_mb())
+        if _open_peaks:
+            _open_peaks[-1] = max(_open_peaks[-1], peak)
+        record.update(
+            wall_s=wall,
+            cpu_s=cpu,
+            child_cpu_s=(after.ru_utime + after.ru_stime)
+            - (children.ru_utime + children.ru_stime),
+            peak_rss_mb=peak,
+        )
+
+
+class Metrics:
+    """
+    Collects per-step measurements for one pipeline stage.
+
+    Used as a context manager around a stage's work, the whole stage is recorded
+    as ``total`` and everything is written to ``data/metrics/<stage>.json`` on
+    exit, the file each ``dvc.yaml`` stage declares under ``metrics`` so that
+    ``dvc metrics diff`` compares runs between commits.
+    """
+
+    def __init__(self, stage: str, path: Path | None = None):
+        self.stage = stage
+        self.path = path or Paths.METRICS / f"{stage}.json"
+        self.steps: dict[str, dict] = {}
+        self._total = None
+        self._total_record: dict = {}
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[dict]:
+        """
+        Measures one named sub-step, see ``measure``.
+
+        :param name: Step name, e.g. ``onspd`` or ``route/gpp``.
+        :return: The step's record, to which counters can be added.
+        """
+        with measure() as record:
+            yield record
+        self.record(name, **record)
+
+    def record(self, name: str, **values) -> None:
+        """
+        Adds values to a step, such as measurements taken in a worker process.
+
+        :param name: Step name.
+        :param values: Values to record.
+        """
+        self.steps.setdefault(name, {}).update(values)
+
+    def write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.steps, indent=2))
+
+    def __enter__(self) -> "Metrics":
+        self._total = measure()
+        self._total_record = self._total.__enter__()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._total.__exit__(*exc)
+        self.steps = {"total": self._total_record, **self.steps}
+        self.write()
@@ -0,0 +1,142 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from ahah.common.graph import RoadGraph, compile_graph
+from ahah.common.routing import RoutingSession
+from ahah.common.utils import Paths, file_hash
+
+
+class PoiIndex:
+    """
+    Precomputed nearest-POI travel times for every road node.
+
+    For each POI category one multi-source Dijkstra over the whole network is
+    run at build time, leaving the time to the nearest POI and that POI's road
+    node for every node. These arrays are saved as ``.npy`` files and
+    memory-mapped on open, so a query only snaps the origins to the road network
+    and reads one entry per origin. Times are stored as float32 and match the
+    ``*_distances.parquet`` outputs for origins snapped to the same nodes.
+    """
+
+    def __init__(self, graph: RoadGraph, tree: cKDTree, path: Path):
+        self.graph = graph
+        self.tree = tree
+        self.path = path
+        manifest = json.loads((path / "manifest.json").read_text())
+        self.categories = sorted(manifest["categories"])
+        self._fields = {}
+
+    @classmethod
+    def build(
+        cls,
+        sources: dict[str, Path],
+        path: Path = Paths.OPROAD / "poi_index",
+        graph: RoadGraph | None = None,
+        tree: cKDTree | None = None,
+    ) -> "PoiIndex":
+        """
+        Builds or updates the index, rerouting only categories whose POI file or
+        road graph changed since the last build. Categories not in ``sources``
+        are kept while the road graph is unchanged.
+
+        :param sources: POI parquet files with ``easting`` and ``northing``, by
+            category name.
+        :param path: Directory for the index.
+        :param graph: Road graph, the compiled graph by default.
+        :param tree: KD-tree over ``graph.coords``.
+        :return: The opened index.
+        """
+        if graph is None or tree is None:
+            graph, tree = compile_graph()
+        path.mkdir(parents=True, exist_ok=True)
+        manifest_file = path / "manifest.json"
+        manifest = {"graph": graph.key, "categories": {}}
+        if manifest_file.exists():
+            saved = json.loads(manifest_file.read_text())
+            if saved["graph"] is not None and saved["graph"] == manifest["graph"]:
+                manifest["categories"] = saved["categories"]
+
+        session = RoutingSession(graph, backend="scipy", tree=tree)
+        for name, file in sources.items():
+            digest = file_hash(file)
+            if manifest["categories"].get(name) == digest:
+                continue
+            # dropped from the manifest first, so an interrupted write is rebuilt
+            manifest["categories"].pop(name, None)
+            manifest_file.write_text(json.dumps(manifest, indent=2))
+            source = pd.read_parquet(file).dropna(subset=["easting", "northing"])
+            dist, nearest = session.search(session.snap(source))
+            np.save(path / f"{name}_time.npy", dist.astype(np.float32))
+            np.save(path / f"{name}_nearest.npy", nearest)
+            manifest["categories"][name] = digest
+        manifest_file.write_text(json.dumps(manifest, indent=2))
+        return cls(graph, tree, path)
+
+    @classmethod
+    def open(
+        cls,
+        path: Path = Paths.OPROAD / "poi_index",
+        graph: RoadGraph | None = None,
+        tree: cKDTree | None = None,
+    ) -> "PoiIndex":
+        """
+        Opens an index written by ``build``, raising ``ValueError`` unless both
+        it and ``graph`` come from the same compiled road graph.
+
+        :param path: Directory of the index.
+        :param graph: Road graph the index was built on, the compiled graph by
+            default.
+        :param tree: KD-tree over ``graph.coords``.
+        :return: PoiIndex.
+        """
+        if graph is None or tree is None:
+            graph, tree = compile_graph()
+        manifest = json.loads((path / "manifest.json").read_text())
+        # an uncached graph has no key, so nothing proves the index matches it
+        if manifest["graph"] is None or manifest["graph"] != graph.key:
+            raise ValueError(
+                "POI index was not built on this compiled road graph, rebuild it "
+                "with ahah.build_poi_index"
+            )
+        return cls(graph, tree, path)
+
+    def _field(self, category: str) -> tuple[np.ndarray, np.ndarray]:
+        if category not in self.categories:
+            raise KeyError(f"Unknown POI category: {category}")
+        if category not in self._fields:
+            self._fields[category] = (
+                np.load(self.path / f"{category}_time.npy", mmap_mode="r"),
+                np.load(self.path / f"{category}_nearest.npy", mmap_mode="r"),
+            )
+        return self._fields[category]
+
+    def query(self, points: pd.DataFrame, category: str) -> pd.DataFrame:
+        """
+        Finds the travel time from each point to the nearest POI of a category.
+
+        :param points: DataFrame with ``easting`` and ``northing`` columns.
+        :param category: POI category, one of ``categories``.
+        :return: ``points`` with ``node_id`` and ``snap_distance`` of the snapped
+            road node, ``time_weighted`` (``NaN`` where no POI is reachable) and
+            ``nearest_poi``, the road node of the nearest POI.
+        """
+        time, nearest = self._field(category)
+        snap_distance, idx = self.tree.query(
+            points[["easting", "northing"]].to_numpy(), workers=-1
+        )
+        node_time = time[idx].astype(np.float64)
+        node_nearest = nearest[idx]
+        nearest_poi = pd.array(
+            self.graph.node_ids[np.maximum(node_nearest, 0)], dtype="Int64"
+        )
+        nearest_poi[node_nearest < 0] = pd.NA
+        return points.assign(
+            node_id=self.graph.node_ids[idx],
+            snap_distance=snap_distance,
+            time_weighted=np.where(np.isinf(node_time), np.nan, node_time),
+            nearest_poi=nearest_poi,
+        )
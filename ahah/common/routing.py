@@ -0,0 +1,810 @@
+import argparse
+import heapq
+import multiprocessing as mp
+import tempfile
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from tqdm import tqdm
+
+from ahah.common.graph import RoadGraph, compile_graph
+from ahah.common.metrics import Metrics, measure
+from ahah.common.utils import Paths
+
+BACKENDS = ["networkx", "scipy"]
+ROW_GROUP_SIZE = 250_000
+THIN_METHODS = ["node", "grid"]
+# Liverpool City Region, large enough to contain several POIs of every type
+SAMPLE_BBOX = (320_000.0, 370_000.0, 360_000.0, 410_000.0)
+
+
+class RoutingSession:
+    """
+    Routes any number of POI sources to a fixed set of postcodes.
+
+    The road graph, the node KD-tree and the snapping of postcodes to their
+    nearest road node are built once when the session is created, so each call
+    to ``route`` only snaps the sources and runs a multi-source Dijkstra.
+
+    ``backend`` selects the Dijkstra implementation: ``networkx`` runs
+    ``multi_source_dijkstra_path_length`` over a dict-of-dicts graph, ``scipy``
+    runs ``csgraph.dijkstra(min_only=True)`` directly on the CSR arrays.
+    """
+
+    def __init__(
+        self,
+        graph: RoadGraph,
+        target: pd.DataFrame | None = None,
+        target_idx: np.ndarray | None = None,
+        backend: str = "networkx",
+        tree: cKDTree | None = None,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown routing backend: {backend}")
+        self.graph = graph
+        self.backend = backend
+        self._tree = tree
+        self._nx_graph = None
+        self._csr = None
+        self.target = None
+        self.target_idx = target_idx
+        if target is not None:
+            self.target = target[["postcode", "easting", "northing"]].reset_index(
+                drop=True
+            )
+            if self.target_idx is None and "node_id" in target.columns:
+                self.target_idx = self._snapped_idx(target["node_id"].to_numpy())
+            elif self.target_idx is None:
+                self.target_idx = self.snap(self.target)
+
+    @classmethod
+    def from_frames(
+        cls,
+        nodes: pd.DataFrame,
+        edges: pd.DataFrame,
+        target: pd.DataFrame,
+        backend: str = "networkx",
+    ) -> "RoutingSession":
+        return cls(RoadGraph.from_frames(nodes, edges), target, backend=backend)
+
+    @property
+    def tree(self) -> cKDTree:
+        if self._tree is None:
+            self._tree = cKDTree(self.graph.coords)
+        return self._tree
+
+    @property
+    def nx_graph(self) -> nx.Graph:
+        if self._nx_graph is None:
+            g = self.graph
+            row = np.repeat(np.arange(g.n_nodes), np.diff(g.indptr))
+            nx_graph = nx.Graph()
+            nx_graph.add_nodes_from(range(g.n_nodes))
+            nx_graph.add_weighted_edges_from(
+                zip(row.tolist(), g.indices.tolist(), g.weights.tolist()),
+                weight="time_weighted",
+            )
+            self._nx_graph = nx_graph
+        return self._nx_graph
+
+    @property
+    def csr(self) -> csr_matrix:
+        if self._csr is None:
+            self._csr = self.graph.to_csr()
+        return self._csr
+
+    def _snapped_idx(self, node_id: np.ndarray) -> np.ndarray:
+        idx = np.searchsorted(self.graph.node_ids, node_id)
+        idx = np.minimum(idx, self.graph.n_nodes - 1)
+        if not np.array_equal(self.graph.node_ids[idx], node_id):
+            raise ValueError(
+                "Postcode snapping does not match the road graph, "
+                "rerun ahah.snap_postcodes"
+            )
+        return idx
+
+    def snap(self, points: pd.DataFrame) -> np.ndarray:
+        """
+        Finds the internal index of the nearest road node to each point.
+
+        :param points: DataFrame with ``easting`` and ``northing`` columns.
+        :return: Array of internal node indices.
+        """
+        _, idx = self.tree.query(points[["easting", "northing"]].to_numpy(), workers=-1)
+        return idx
+
+    def search(self, source_idx: np.ndarray) -> tuple[np.ndarray, np.ndarray | None]:
+        """
+        Multi-source Dijkstra from the source nodes to every graph node.
+
+        :param source_idx: Internal indices of the source nodes.
+        :return: Distance to the nearest source, ``inf`` where unreachable, and
+            with the ``scipy`` backend the internal index of that source (``-1``
+            where unreachable). The networkx backend does not track sources and
+            returns ``None`` instead.
+        """
+        if self.backend == "scipy":
+            dist, _, nearest = dijkstra(
+                self.csr,
+                indices=np.unique(source_idx),
+                min_only=True,
+                return_predecessors=True,
+            )
+            return dist, np.where(nearest < 0, -1, nearest).astype(np.int32)
+
+        lengths = nx.multi_source_dijkstra_path_length(
+            self.nx_graph, set(source_idx.tolist()), weight="time_weighted"
+        )
+        dist = np.full(self.graph.n_nodes, np.inf)
+        dist[np.fromiter(lengths.keys(), dtype=np.int64, count=len(lengths))] = (
+            np.fromiter(lengths.values(), dtype=np.float64, count=len(lengths))
+        )
+        return dist, None
+
+    def distances(self, source_idx: np.ndarray) -> np.ndarray:
+        """
+        Time-weighted distance from the nearest source node to every graph node.
+
+        :param source_idx: Internal indices of the source nodes.
+        :return: Array of length ``n_nodes``, ``inf`` where unreachable.
+        """
+        return self.search(source_idx)[0]
+
+    def update(
+        self, dist: np.ndarray, nearest: np.ndarray, source_idx: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Updates a previous ``search`` result for a changed set of sources.
+
+        Nodes whose nearest source was removed are re-searched on the subgraph
+        they form, seeded across its boundary from the unaffected nodes around
+        it, whose distances cannot change. Added sources then run a Dijkstra
+        that stops at any node it cannot bring closer, so its cost grows with
+        the area the new sources win rather than the whole network. Requires
+        the ``scipy`` backend.
+
+        :param dist: Previous node distances.
+        :param nearest: Previous nearest source index per node.
+        :param source_idx: Internal indices of the new source nodes.
+        :return: Updated ``(dist, nearest)``.
+        """
+        if self.backend != "scipy":
+            raise ValueError("Incremental routing requires the scipy backend")
+
+        g = self.graph
+        dist, nearest = dist.copy(), nearest.copy()
+        sources = np.unique(source_idx)
+        is_source = np.zeros(g.n_nodes, dtype=bool)
+        is_source[sources] = True
+
+        affected = (nearest >= 0) & ~is_source[np.maximum(nearest, 0)]
+        if affected.any():
+            row = np.repeat(np.arange(g.n_nodes), np.diff(g.indptr))
+            edge = ~affected[row] & affected[g.indices] & (nearest[row] >= 0)
+            seed_source = nearest[row[edge]]
+            seed_node = g.indices[edge]
+            seed_dist = dist[row[edge]] + g.weights[edge]
+
+            # only the cheapest seed into each boundary node can matter
+            order = np.lexsort((seed_dist, seed_node))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = seed_node[order][1:] != seed_node[order][:-1]
+            order = order[first]
+            seed_source, seed_node = seed_source[order], seed_node[order]
+            seed_dist = seed_dist[order]
+
+            region = g.subgraph(affected)
+            remap = np.cumsum(affected) - 1
+            supers, seed_super = np.unique(seed_source, return_inverse=True)
+            n, k = region.n_nodes, len(supers)
+            order = np.argsort(seed_super, kind="stable")
+            counts = np.bincount(seed_super, minlength=k)
+            stacked = csr_matrix(
+                (
+                    np.concatenate([region.weights, seed_dist[order]]),
+                    np.concatenate([region.indices, remap[seed_node[order]]]),
+                    np.concatenate([region.indptr, region.n_edges + np.cumsum(counts)]),
+                ),
+                shape=(n + k, n + k),
+            )
+            region_dist, _, region_super = dijkstra(
+                stacked,
+                indices=np.arange(n, n + k),
+                min_only=True,
+                return_predecessors=True,
+            )
+            reached = region_super[:n] >= 0
+            dist[affected] = region_dist[:n]
+            nearest[affected] = np.where(
+                reached, supers[np.maximum(region_super[:n] - n, 0)], -1
+            )
+
+        added = sources[nearest[sources] != sources]
+        if len(added):
+            pruned_search(g, added, dist, nearest)
+        return dist, nearest
+
+    def distances_batched(self, source_idx: list[np.ndarray]) -> np.ndarray:
+        """
+        Distances from several source sets in a single Dijkstra call.
+
+        With the ``scipy`` backend each source set becomes a virtual super-source
+        node joined to its sources by zero-weight edges, and all super-sources are
+        searched in one ``csgraph.dijkstra`` call over the stacked graph. That
+        call still makes one full traversal per source set, so it only saves the
+        per-call overhead and nearest-source tracking of ``distances``. Other
+        backends fall back to one search per source set.
+
+        :param source_idx: Internal source node indices for each category.
+        :return: Array of shape ``(len(source_idx), n_nodes)``.
+        """
+        if self.backend != "scipy":
+            return np.vstack([self.distances(idx) for idx in source_idx])
+
+        g = self.graph
+        sources = [np.unique(idx) for idx in source_idx]
+        n, k = g.n_nodes, len(sources)
+        indptr = np.concatenate(
+            [g.indptr, g.indptr[-1] + np.cumsum([len(idx) for idx in sources])]
+        )
+        indices = np.concatenate([g.indices, *sources])
+        weights = np.concatenate([g.weights, np.zeros(len(indices) - g.n_edges)])
+        stacked = csr_matrix((weights, indices, indptr), shape=(n + k, n + k))
+        return dijkstra(stacked, indices=np.arange(n, n + k))[:, :n]
+
+    def to_frame(
+        self, target_dist: np.ndarray, target_nearest: np.ndarray | None = None
+    ) -> pd.DataFrame:
+        """
+        Attaches distances at the snapped target nodes to the target postcodes.
+
+        :param target_dist: Distance for each target, aligned with ``target_idx``.
+        :param target_nearest: Optional nearest source index for each target.
+        :return: DataFrame with ``postcode``, ``easting``, ``northing``,
+            ``node_id`` and ``time_weighted`` columns, plus ``nearest_poi`` (the
+            road node of the nearest POI) when ``target_nearest`` is given.
+        """
+        frame = self.target.assign(
+            node_id=self.graph.node_ids[self.target_idx],
+            time_weighted=np.where(np.isinf(target_dist), np.nan, target_dist),
+        )
+        if target_nearest is not None:
+            frame["nearest_poi"] = pd.array(
+                self.graph.node_ids[np.maximum(target_nearest, 0)], dtype="Int64"
+            )
+            frame.loc[target_nearest < 0, "nearest_poi"] = pd.NA
+        return frame
+
+    def search_targets(
+        self, source_idx: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray | None, dict]:
+        """
+        Runs ``search`` and keeps only the results at the targets.
+
+        :param source_idx: Internal indices of the source nodes.
+        :return: Distance and nearest source index for each target, aligned with
+            ``target_idx`` (the nearest source is ``None`` with networkx), and the
+            search's measurements and ``search_stats``.
+        """
+        with measure() as stats:
+            dist, nearest = self.search(source_idx)
+        stats.update(search_stats(self.graph, dist, source_idx))
+        if nearest is not None:
+            nearest = nearest[self.target_idx]
+        return dist[self.target_idx], nearest, stats
+
+    def route_targets(
+        self, source: pd.DataFrame
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        """
+        Routes from every source, keeping only the results at the targets.
+
+        :param source: POI DataFrame with ``easting`` and ``northing`` columns.
+        :return: Distance and nearest source index for each target, aligned with
+            ``target_idx``; the nearest source is ``None`` with networkx.
+        """
+        dist, nearest, _ = self.search_targets(self.snap(source))
+        return dist, nearest
+
+    def route(self, source: pd.DataFrame) -> pd.DataFrame:
+        """
+        Routes from every source to every target postcode.
+
+        :param source: POI DataFrame with ``easting`` and ``northing`` columns.
+        :return: DataFrame in the ``*_distances.parquet`` schema.
+        """
+        return self.to_frame(*self.route_targets(source))
+
+    def route_incremental(
+        self, source: pd.DataFrame, state: Path
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Routes a POI type, reusing the node-level result saved in ``state``.
+
+        The state file holds the distance and nearest source of every graph node
+        from the last run. If it is missing or was written against a different
+        road graph, the POI type is routed from scratch.
+
+        :param source: POI DataFrame with ``easting`` and ``northing`` columns.
+        :param state: Path of the ``.npz`` state file, rewritten afterwards.
+        :return: Distance and nearest source index for each target.
+        """
+        key = self.graph.key
+        source_idx = self.snap(source)
+        if key is not None and state.exists():
+            saved = np.load(state)
+            if str(saved["key"]) == key:
+                dist, nearest = self.update(saved["dist"], saved["nearest"], source_idx)
+            else:
+                dist, nearest = self.search(source_idx)
+        else:
+            dist, nearest = self.search(source_idx)
+        if key is not None:
+            state.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(state, dist=dist, nearest=nearest, key=key)
+        return dist[self.target_idx], nearest[self.target_idx]
+
+    def write(
+        self,
+        path: Path,
+        columns: dict[str, np.ndarray],
+        target_nearest: np.ndarray | None = None,
+        row_group_size: int = ROW_GROUP_SIZE,
+    ) -> None:
+        """
+        Streams target results to parquet one row group at a time.
+
+        Rows are converted to Arrow a chunk at a time, so the full result is
+        never materialised as a DataFrame. Postcodes are dictionary-encoded
+        (read back by pandas as categorical), coordinates and times are float32
+        and node ids int32 where they fit.
+
+        :param path: Output parquet path.
+        :param columns: Distance arrays aligned with ``target_idx``, by name.
+        :param target_nearest: Optional nearest source index for each target,
+            written as ``nearest_poi``.
+        :param row_group_size: Rows per parquet row group.
+        """
+        node_ids = self.graph.node_ids
+        id_type = (
+            pa.int32()
+            if node_ids.max(initial=0) < np.iinfo(np.int32).max
+            else pa.int64()
+        )
+        fields = [
+            ("postcode", pa.dictionary(pa.int32(), pa.string())),
+            ("easting", pa.float32()),
+            ("northing", pa.float32()),
+            ("node_id", id_type),
+            *[(name, pa.float32()) for name in columns],
+        ]
+        if target_nearest is not None:
+            fields.append(("nearest_poi", id_type))
+        schema = pa.schema(fields)
+
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for start in range(0, len(self.target), row_group_size):
+                rows = slice(start, start + row_group_size)
+                target = self.target.iloc[rows]
+                arrays = [
+                    pa.array(target["postcode"].astype(str)).dictionary_encode(),
+                    pa.array(target["easting"], type=pa.float32()),
+                    pa.array(target["northing"], type=pa.float32()),
+                    pa.array(node_ids[self.target_idx[rows]], type=id_type),
+                ]
+                for dist in columns.values():
+                    chunk = dist[rows].astype(np.float32)
+                    arrays.append(pa.array(np.where(np.isinf(chunk), np.nan, chunk)))
+                if target_nearest is not None:
+                    nearest = target_nearest[rows]
+                    arrays.append(
+                        pa.array(
+                            node_ids[np.maximum(nearest, 0)],
+                            type=id_type,
+                            mask=nearest < 0,
+                        )
+                    )
+                writer.write_table(
+                    pa.Table.from_arrays(arrays, schema=schema),
+                    row_group_size=row_group_size,
+                )
+
+    def route_many(
+        self, sources: dict[str, pd.DataFrame], workers: int = 1
+    ) -> Iterator[tuple[str, np.ndarray, np.ndarray | None, dict]]:
+        """
+        Routes several POI types, in parallel when ``workers`` is above one.
+
+        Workers memory-map the CSR arrays and target snapping, so the graph is
+        never pickled into each process. A graph opened from the compiled cache
+        is mapped in place, otherwise it is first written to a temporary
+        directory. Results are yielded in completion order. Requires the
+        ``scipy`` backend when ``workers`` is above one, since a networkx graph
+        is rebuilt in every worker's own memory.
+
+        :param sources: Mapping of POI name to POI DataFrame.
+        :param workers: Number of worker processes.
+        :return: Iterator of ``(name, target_dist, target_nearest, stats)``, where
+            ``stats`` holds ``snap_s`` and the ``search_targets`` measurements
+            taken in whichever process ran the search.
+        """
+        if workers > 1 and self.backend != "scipy":
+            raise ValueError("Routing with several workers requires the scipy backend")
+        snapped = {}
+        for name, source in sources.items():
+            start = time.perf_counter()
+            snapped[name] = (self.snap(source), time.perf_counter() - start)
+
+        if workers <= 1:
+            for name, (source_idx, snap_s) in snapped.items():
+                dist, nearest, stats = self.search_targets(source_idx)
+                yield name, dist, nearest, {"snap_s": snap_s, **stats}
+            return
+
+        with tempfile.TemporaryDirectory() as tmp:
+            graph_dir = self.graph.path
+            if graph_dir is None:
+                graph_dir = Path(tmp)
+                self.graph.save(graph_dir)
+            target_idx_path = Path(tmp) / "target_idx.npy"
+            np.save(target_idx_path, self.target_idx)
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(graph_dir, target_idx_path, self.backend),
+            ) as pool:
+                futures = {
+                    pool.submit(_route_worker, source_idx): name
+                    for name, (source_idx, _) in snapped.items()
+                }
+                for future in as_completed(futures):
+                    name = futures[future]
+                    dist, nearest, stats = future.result()
+                    yield name, dist, nearest, {"snap_s": snapped[name][1], **stats}
+
+
+_worker_session: RoutingSession | None = None
+
+
+def _init_worker(graph_dir: Path, target_idx_path: Path, backend: str) -> None:
+    global _worker_session
+    _worker_session = RoutingSession(
+        RoadGraph.load(graph_dir),
+        target_idx=np.load(target_idx_path, mmap_mode="r"),
+        backend=backend,
+    )
+
+
+def _route_worker(
+    source_idx: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray | None, dict]:
+    return _worker_session.search_targets(source_idx)
+
+
+def pruned_search(
+    graph: RoadGraph, source_idx: np.ndarray, dist: np.ndarray, nearest: np.ndarray
+) -> int:
+    """
+    Multi-source Dijkstra that only expands nodes the sources bring closer.
+
+    A node is settled only when its new distance is below ``dist``, and its edges
+    are relaxed only towards neighbours that would also get closer, so the search
+    never leaves the region won by the new sources. ``dist`` and ``nearest`` are
+    updated in place; ties keep the existing source.
+
+    :param graph: Road graph.
+    :param source_idx: Internal indices of the new source nodes.
+    :param dist: Current distance to the nearest source per node.
+    :param nearest: Current nearest source index per node.
+    :return: Number of nodes settled.
+    """
+    heap = [(0.0, source, source) for source in np.unique(source_idx).tolist()]
+    heapq.heapify(heap)
+    settled = 0
+    while heap:
+        node_dist, node, source = heapq.heappop(heap)
+        if node_dist >= dist[node]:
+            continue
+        dist[node], nearest[node] = node_dist, source
+        settled += 1
+        start, end = graph.indptr[node], graph.indptr[node + 1]
+        neighbours = graph.indices[start:end]
+        neighbour_dist = node_dist + graph.weights[start:end]
+        closer = neighbour_dist < dist[neighbours]
+        for neighbour, new_dist in zip(
+            neighbours[closer].tolist(), neighbour_dist[closer].tolist()
+        ):
+            heapq.heappush(heap, (new_dist, neighbour, source))
+    return settled
+
+
+def search_stats(graph: RoadGraph, dist: np.ndarray, source_idx: np.ndarray) -> dict:
+    """
+    Counts the work done by an unbounded multi-source Dijkstra.
+
+    Both backends settle every reachable node once and relax each of its edges,
+    so the counts follow from which nodes ended with a finite distance.
+
+    :param graph: Road graph that was searched.
+    :param dist: Distance to every node, ``inf`` where unreachable.
+    :param source_idx: Internal indices of the source nodes.
+    :return: Dict with ``sources``, ``nodes_settled`` and ``edges_relaxed``.
+    """
+    settled = np.isfinite(dist)
+    return {
+        "sources": len(np.unique(source_idx)),
+        "nodes_settled": int(settled.sum()),
+        "edges_relaxed": int(np.diff(graph.indptr)[settled].sum()),
+    }
+
+
+def snap_points(graph: RoadGraph, tree: cKDTree, points: pd.DataFrame) -> pd.DataFrame:
+    """
+    Snaps points to their nearest road node in one vectorised KD-tree query.
+
+    :param graph: Road graph the tree was built over.
+    :param tree: KD-tree over ``graph.coords``.
+    :param points: DataFrame with ``easting`` and ``northing`` columns.
+    :return: ``points`` with ``node_id`` and ``snap_distance`` columns added.
+    """
+    dist, idx = tree.query(points[["easting", "northing"]].to_numpy(), workers=-1)
+    return points.assign(node_id=graph.node_ids[idx], snap_distance=dist)
+
+
+def thin_sources(
+    points: pd.DataFrame,
+    method: str,
+    spacing: float | None = None,
+    graph: RoadGraph | None = None,
+    tree: cKDTree | None = None,
+) -> pd.DataFrame:
+    """
+    Reduces a dense set of source points, such as water body vertices.
+
+    ``node`` keeps one point per nearest road node. Routing snaps sources to
+    nodes anyway, so this leaves distances unchanged. ``grid`` keeps one point
+    per ``spacing`` metre square, moving each source by at most the cell
+    diagonal.
+
+    :param points: DataFrame with ``easting`` and ``northing`` columns.
+    :param method: ``node`` or ``grid``.
+    :param spacing: Grid cell size in metres, required for ``grid``.
+    :param graph: Road graph, required for ``node``.
+    :param tree: KD-tree over ``graph.coords``, required for ``node``.
+    :return: Subset of ``points``; ``node`` also adds ``node_id`` and
+        ``snap_distance``.
+    """
+    if method == "node":
+        if graph is None or tree is None:
+            raise ValueError("Thinning by node requires the road graph and tree")
+        return snap_points(graph, tree, points).drop_duplicates("node_id")
+    if method == "grid":
+        if spacing is None or spacing <= 0:
+            raise ValueError("Thinning on a grid requires a positive spacing")
+        cells = np.floor(points[["easting", "northing"]].to_numpy() / spacing)
+        return points[~pd.DataFrame(cells).duplicated().to_numpy()]
+    raise ValueError(f"Unknown thinning method: {method}")
+
+
+def _bbox_subset(
+    graph: RoadGraph, bbox: tuple[float, float, float, float], *frames: pd.DataFrame
+) -> tuple[RoadGraph, list[pd.DataFrame]]:
+    # the road graph and point tables clipped to a sample region, for the
+    # regional checks that rerun a search several ways
+    x, y = graph.coords[:, 0], graph.coords[:, 1]
+    region = graph.subgraph(
+        (x >= bbox[0]) & (x <= bbox[2]) & (y >= bbox[1]) & (y <= bbox[3])
+    )
+    return region, [
+        df[
+            df["easting"].between(bbox[0], bbox[2])
+            & df["northing"].between(bbox[1], bbox[3])
+        ]
+        for df in frames
+    ]
+
+
+def thinning_error(
+    graph: RoadGraph,
+    target: pd.DataFrame,
+    full: pd.DataFrame,
+    thinned: pd.DataFrame,
+    bbox: tuple[float, float, float, float],
+) -> dict[str, float]:
+    """
+    Measures the distance error of thinned sources within a region.
+
+    :param graph: Full road graph.
+    :param target: Target postcodes.
+    :param full: Sources before thinning.
+    :param thinned: Sources after thinning.
+    :param bbox: ``(min_easting, min_northing, max_easting, max_northing)``.
+    :return: Source counts in the region, the largest and mean absolute change in
+        ``time_weighted`` and the share of postcodes whose distance changed.
+    """
+    region, (target, full, thinned) = _bbox_subset(graph, bbox, target, full, thinned)
+    if len(full) == 0:
+        raise ValueError("No sources fall inside the sample region")
+
+    session = RoutingSession(region, target, backend="scipy")
+    a, _ = session.route_targets(full)
+    b, _ = session.route_targets(thinned)
+    reachable = np.isfinite(a) & np.isfinite(b)
+    diff = np.abs(a[reachable] - b[reachable])
+    return {
+        "sources": len(full),
+        "thinned": len(thinned),
+        "max_error": float(diff.max(initial=0.0)),
+        "mean_error": float(diff.mean()) if len(diff) else 0.0,
+        "changed": float((diff > 1e-9).mean()) if len(diff) else 0.0,
+    }
+
+
+def check_backends(
+    graph: RoadGraph,
+    target: pd.DataFrame,
+    source: pd.DataFrame,
+    bbox: tuple[float, float, float, float],
+    rtol: float = 1e-6,
+) -> float:
+    """
+    Checks that the ``scipy`` backend reproduces ``networkx`` within a region.
+
+    :param graph: Full road graph.
+    :param target: Target postcodes.
+    :param source: POI sources.
+    :param bbox: ``(min_easting, min_northing, max_easting, max_northing)``.
+    :param rtol: Relative tolerance on ``time_weighted``.
+    :return: Largest absolute difference between the two backends.
+    """
+    region, (target, source) = _bbox_subset(graph, bbox, target, source)
+    if len(source) == 0:
+        raise ValueError("No sources fall inside the sample region")
+
+    nx_dist = RoutingSession(region, target, backend="networkx").route(source)
+    sp_dist = RoutingSession(region, target, backend="scipy").route(source)
+    a, b = nx_dist["time_weighted"].to_numpy(), sp_dist["time_weighted"].to_numpy()
+    if not np.allclose(a, b, rtol=rtol, equal_nan=True):
+        raise AssertionError("scipy and networkx routing backends disagree")
+    return float(np.nanmax(np.abs(a - b), initial=0.0))
+
+
+def route_files(
+    session: RoutingSession,
+    pq_files: list[Path],
+    out_dir: Path,
+    workers: int = 1,
+    incremental: bool = False,
+    metrics: Metrics | None = None,
+) -> None:
+    """
+    Routes every POI parquet file that does not yet have a distances output.
+
+    In incremental mode every file is routed, updating the node-level state in
+    ``out_dir / "state"`` from the previous run rather than starting over.
+
+    :param session: Routing session holding the graph and target postcodes.
+    :param pq_files: Processed POI parquet files.
+    :param out_dir: Directory for ``{stem}_distances.parquet`` outputs.
+    :param workers: Number of worker processes, ignored when incremental.
+    :param incremental: Update existing outputs for added and removed POIs.
+    :param metrics: Optional collector for a ``route/<poi>`` step per file, with
+        snapping time and search counts, and a ``write/<poi>`` step.
+    """
+    metrics = metrics or Metrics("route")
+    if incremental:
+        for file in tqdm(pq_files):
+            source = pd.read_parquet(file).dropna(subset=["easting", "northing"])
+            with metrics.step(f"route/{file.stem}") as step:
+                dist, nearest = session.route_incremental(
+                    source, out_dir / "state" / f"{file.stem}.npz"
+                )
+                step["pois"] = len(source)
+            with metrics.step(f"write/{file.stem}"):
+                session.write(
+                    out_dir / f"{file.stem}_distances.parquet",
+                    {"time_weighted": dist},
+                    nearest,
+                )
+        return
+
+    sources = {
+        file.stem: pd.read_parquet(file).dropna(subset=["easting", "northing"])
+        for file in pq_files
+        if not (out_dir / f"{file.stem}_distances.parquet").exists()
+    }
+    for name, dist, nearest, stats in tqdm(
+        session.route_many(sources, workers=workers), total=len(sources)
+    ):
+        metrics.record(f"route/{name}", **stats)
+        with metrics.step(f"write/{name}"):
+            session.write(
+                out_dir / f"{name}_distances.parquet", {"time_weighted": dist}, nearest
+            )
+
+
+def route_files_batched(
+    session: RoutingSession, pq_files: list[Path], outfile: Path
+) -> None:
+    """
+    Routes every POI parquet file together into one wide distances table.
+
+    :param session: Routing session holding the graph and target postcodes.
+    :param pq_files: Processed POI parquet files, one column each named by stem.
+    :param outfile: Path of the wide parquet output.
+    """
+    sources = {
+        file.stem: pd.read_parquet(file).dropna(subset=["easting", "northing"])
+        for file in pq_files
+    }
+    dist = session.distances_batched(
+        [session.snap(source) for source in sources.values()]
+    )
+    session.write(outfile, dict(zip(sources.keys(), dist[:, session.target_idx])))
+
+
+def route_main(poi_dir: Path, out_dir: Path, stage: str) -> None:
+    """
+    Command line entry point shared by the routing scripts.
+
+    Parses the routing options, routes every POI parquet file in ``poi_dir`` to
+    the snapped postcodes and records metrics under ``stage``.
+
+    :param poi_dir: Directory of processed POI parquet files.
+    :param out_dir: Directory for the distances outputs.
+    :param stage: Metrics name, written to ``data/metrics/<stage>.json``.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--backend", choices=BACKENDS, default="networkx")
+    parser.add_argument(
+        "--batched",
+        action="store_true",
+        help="route all POI types in one call into a single wide table",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="update existing outputs for added and removed POIs (scipy only)",
+    )
+    args = parser.parse_args()
+    if args.incremental and args.backend != "scipy":
+        parser.error("--incremental requires --backend scipy")
+    if args.workers > 1 and args.backend != "scipy":
+        # each worker would build its own in-memory networkx graph from the
+        # shared CSR arrays, multiplying memory rather than sharing it
+        parser.error("--workers above 1 requires --backend scipy")
+
+    with Metrics(stage) as metrics:
+        with metrics.step("load"):
+            postcodes = pd.read_parquet(
+                Paths.PROCESSED / "onspd" / "postcode_nodes.parquet"
+            )
+            graph, tree = compile_graph()
+            session = RoutingSession(graph, postcodes, backend=args.backend, tree=tree)
+
+        pq_files = list(poi_dir.glob("*.parquet"))
+        if args.batched:
+            with metrics.step("route/batched") as step:
+                route_files_batched(session, pq_files, out_dir / "distances.parquet")
+                step["poi_types"] = len(pq_files)
+        else:
+            route_files(
+                session,
+                pq_files,
+                out_dir,
+                workers=args.workers,
+                incremental=args.incremental,
+                metrics=metrics,
+            )
@@ -0,0 +1,157 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from ahah.common.utils import Paths
+
+ZONE_COL = "LSOA21CD"
+
+
+def normalise_postcodes(postcodes) -> np.ndarray:
+    """
+    Upper-cases postcodes and removes spaces, matching the processed ONSPD.
+
+    :param postcodes: Postcode strings.
+    :return: Array of normalised postcodes as bytes.
+    """
+    # a list comprehension is several times faster than ``np.char`` on the small
+    # batches a lookup service sees
+    return np.array(
+        [postcode.replace(" ", "").upper().encode() for postcode in postcodes],
+        dtype=np.bytes_,
+    )
+
+
+def build_store(
+    dists: pl.DataFrame,
+    ids: pl.DataFrame,
+    zones: pd.DataFrame,
+    index: pd.DataFrame,
+    path: Path = Paths.OUT / "store",
+) -> None:
+    """
+    Writes postcode distances and the zone-level index as flat ``.npy`` arrays.
+
+    Postcodes are stored sorted as fixed-width bytes, so they can be binary
+    searched in place, with a row-major matrix of POI distances aligned with
+    them. Index values form a second matrix with one row per zone, and each
+    postcode holds the row of its zone (``-1`` for none). Rows rather than
+    columns keep a lookup to one gather per matrix. The manifest is written
+    last, so an interrupted build cannot be opened.
+
+    :param dists: Output of ``read_dist_columns``, one column per POI type.
+    :param ids: Postcode dictionary with ``postcode`` and ``postcode_id``.
+    :param zones: Postcode to zone lookup with ``postcode`` and ``ZONE_COL``.
+    :param index: Zone-level index with ``ZONE_COL`` and numeric columns.
+    :param path: Directory to write to.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "manifest.json").unlink(missing_ok=True)
+
+    postcodes = (
+        ids.join(dists, on="postcode_id", how="left")
+        .join(
+            pl.from_pandas(zones[["postcode", ZONE_COL]]).with_columns(
+                pl.col("postcode").cast(pl.String)
+            ),
+            on="postcode",
+            how="left",
+        )
+        .with_columns(pl.col("postcode").str.to_uppercase())
+        .sort("postcode")
+    )
+    index = index.sort_values(ZONE_COL, ignore_index=True)
+    zone_pos = pd.Index(index[ZONE_COL]).get_indexer(postcodes[ZONE_COL].to_pandas())
+
+    np.save(path / "postcode.npy", postcodes["postcode"].to_numpy().astype(np.bytes_))
+    np.save(path / "zone_pos.npy", zone_pos.astype(np.int32))
+    np.save(path / "zone.npy", index[ZONE_COL].to_numpy(dtype=str).astype(np.bytes_))
+    dist_cols = [col for col in dists.columns if col != "postcode_id"]
+    np.save(
+        path / "dists.npy",
+        postcodes.select(pl.col(dist_cols).cast(pl.Float32).fill_null(np.nan))
+        .to_numpy()
+        .reshape(len(postcodes), len(dist_cols)),
+    )
+    index_cols = [
+        col
+        for col in index.columns
+        if col != ZONE_COL and pd.api.types.is_numeric_dtype(index[col])
+    ]
+    np.save(path / "index.npy", index[index_cols].to_numpy(dtype=np.float64))
+    (path / "manifest.json").write_text(
+        json.dumps({"distances": dist_cols, "index": index_cols}, indent=2)
+    )
+
+
+class AhahStore:
+    """
+    Memory-mapped postcode lookups of distances and AHAH index values.
+
+    Opening maps every column written by ``build_store`` without reading it, so
+    cold starts take milliseconds and pages are shared between processes. A
+    batch lookup is one binary search over the sorted postcodes followed by
+    array gathers.
+    """
+
+    def __init__(self, path: Path = Paths.OUT / "store"):
+        manifest = json.loads((path / "manifest.json").read_text())
+        self.distance_columns = manifest["distances"]
+        self.index_columns = manifest["index"]
+        self.postcodes = np.load(path / "postcode.npy", mmap_mode="r")
+        self.zone_pos = np.load(path / "zone_pos.npy", mmap_mode="r")
+        self.zones = np.load(path / "zone.npy", mmap_mode="r")
+        self.dists = np.load(path / "dists.npy", mmap_mode="r")
+        self.index = np.load(path / "index.npy", mmap_mode="r")
+
+    def lookup(self, postcodes) -> dict[str, np.ndarray]:
+        """
+        Looks up a batch of postcodes.
+
+        :param postcodes: Postcode strings, with or without spaces.
+        :return: Columns aligned with ``postcodes``: ``postcode`` (normalised),
+            ``found``, ``ZONE_COL`` (empty where unknown), one column per POI
+            distance and one per index column, ``NaN`` where unknown.
+        """
+        keys = normalise_postcodes(postcodes)
+        pos = np.minimum(np.searchsorted(self.postcodes, keys), len(self.postcodes) - 1)
+        found = self.postcodes[pos] == keys
+        zone_pos = np.where(found, self.zone_pos[pos], -1)
+        in_zone = zone_pos >= 0
+        zone_pos = np.maximum(zone_pos, 0)
+
+        dists = self.dists[pos]
+        dists[~found] = np.nan
+        index = self.index[zone_pos]
+        index[~in_zone] = np.nan
+        zones = self.zones[zone_pos].astype(str)
+        zones[~in_zone] = ""
+        return {
+            "postcode": keys.astype(str),
+            "found": found,
+            ZONE_COL: zones,
+            **dict(zip(self.distance_columns, dists.T)),
+            **dict(zip(self.index_columns, index.T)),
+        }
+
+    def records(self, postcodes) -> list[dict]:
+        """
+        Looks up a batch of postcodes as JSON-ready records.
+
+        :param postcodes: Postcode strings, with or without spaces.
+        :return: One dict per postcode, ``None`` where a value is unknown.
+        """
+        columns = self.lookup(postcodes)
+        records = []
+        for i in range(len(columns["postcode"])):
+            record = {}
+            for col, values in columns.items():
+                value = values[i].item()
+                if value == "" or (isinstance(value, float) and np.isnan(value)):
+                    value = None
+                record[col] = value
+            records.append(record)
+        return records
@@ -0,0 +1,166 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from ahah.common.graph import RoadGraph
+from ahah.common.routing import RoutingSession
+
+# metres
+TILE_SIZE = 50_000.0
+HALO = 20_000.0
+
+
+def tile_keys(
+    easting: np.ndarray, northing: np.ndarray, tile_size: float, origin: tuple
+) -> np.ndarray:
+    """
+    Assigns points to square tiles, keyed ``"<column>_<row>"``.
+
+    :param easting: Point eastings.
+    :param northing: Point northings.
+    :param tile_size: Tile width in metres.
+    :param origin: Lower-left corner of tile ``0_0``.
+    :return: Array of tile keys.
+    """
+    col = np.floor((easting - origin[0]) / tile_size).astype(np.int64)
+    row = np.floor((northing - origin[1]) / tile_size).astype(np.int64)
+    return np.char.add(np.char.add(col.astype(str), "_"), row.astype(str))
+
+
+def plan_tiles(postcodes: pd.DataFrame, tile_size: float = TILE_SIZE) -> dict:
+    """
+    Splits the postcode extent into square tiles, keeping those with postcodes.
+
+    :param postcodes: DataFrame with ``easting`` and ``northing``.
+    :param tile_size: Tile width in metres.
+    :return: Dict with ``tile_size``, ``origin`` and ``tiles``, mapping each tile
+        key to its bounds ``(x0, y0, x1, y1)`` and postcode count.
+    """
+    origin = (
+        float(np.floor(postcodes["easting"].min() / tile_size) * tile_size),
+        float(np.floor(postcodes["northing"].min() / tile_size) * tile_size),
+    )
+    keys, counts = np.unique(
+        tile_keys(
+            postcodes["easting"].to_numpy(),
+            postcodes["northing"].to_numpy(),
+            tile_size,
+            origin,
+        ),
+        return_counts=True,
+    )
+    tiles = {}
+    for key, count in zip(keys.tolist(), counts.tolist()):
+        col, row = map(int, key.split("_"))
+        x0, y0 = origin[0] + col * tile_size, origin[1] + row * tile_size
+        tiles[key] = {
+            "bounds": [x0, y0, x0 + tile_size, y0 + tile_size],
+            "postcodes": count,
+        }
+    return {"tile_size": tile_size, "origin": origin, "tiles": tiles}
+
+
+def read_tile_graph(
+    nodes_path: Path, edges_path: Path, bounds: tuple, halo: float
+) -> tuple[RoadGraph, np.ndarray]:
+    """
+    Reads the part of the road network within ``halo`` metres of a tile.
+
+    Only the selected rows of ``nodes.parquet`` and ``edges.parquet`` are
+    collected, so memory grows with the tile rather than the country.
+
+    :param nodes_path: Path to ``nodes.parquet``.
+    :param edges_path: Path to ``edges.parquet``.
+    :param bounds: Tile ``(x0, y0, x1, y1)``.
+    :param halo: Buffer around the tile in metres.
+    :return: The tile's RoadGraph and the internal indices of its boundary
+        nodes, those with an edge leaving the buffered tile.
+    """
+    x0, y0, x1, y1 = bounds
+    nodes = (
+        pl.scan_parquet(nodes_path)
+        .select("node_id", "easting", "northing")
+        .filter(
+            pl.col("easting").is_between(x0 - halo, x1 + halo)
+            & pl.col("northing").is_between(y0 - halo, y1 + halo)
+        )
+        .collect()
+    )
+    ids = nodes["node_id"]
+    edges = (
+        pl.scan_parquet(edges_path)
+        .select("start_node", "end_node", "time_weighted")
+        .with_columns(
+            start_in=pl.col("start_node").is_in(ids),
+            end_in=pl.col("end_node").is_in(ids),
+        )
+        .filter(pl.col("start_in") | pl.col("end_in"))
+        .collect()
+    )
+    graph = RoadGraph.from_frames(
+        nodes.to_pandas(),
+        edges.filter(pl.col("start_in") & pl.col("end_in")).to_pandas(),
+    )
+    cut = edges.filter(pl.col("start_in") != pl.col("end_in"))
+    boundary = np.unique(
+        np.concatenate(
+            [
+                cut.filter(pl.col("start_in"))["start_node"].to_numpy(),
+                cut.filter(pl.col("end_in"))["end_node"].to_numpy(),
+            ]
+        )
+    )
+    return graph, np.searchsorted(graph.node_ids, boundary)
+
+
+def route_tile(
+    graph: RoadGraph,
+    boundary_idx: np.ndarray,
+    target_nodes: np.ndarray,
+    sources: dict[str, np.ndarray],
+    backend: str = "scipy",
+) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray], dict]:
+    """
+    Routes the targets of one tile against the sources inside its halo.
+
+    A route that leaves the buffered tile last re-enters it through a boundary
+    node, so it is at least as long as the target's distance to the nearest
+    boundary node. Any result no longer than that distance is therefore exact,
+    and the rest are flagged as possibly affected by the halo: a shorter route
+    through, or a nearer source beyond, the buffer may exist.
+
+    :param graph: Tile graph from ``read_tile_graph``.
+    :param boundary_idx: Its boundary node indices.
+    :param target_nodes: Road node id each target postcode is snapped to.
+    :param sources: Road node ids of the sources, by POI name, already snapped to
+        the full network; nodes outside the tile graph are ignored.
+    :param backend: Routing backend.
+    :return: Distances and halo flags for each target by POI name, aligned with
+        ``target_nodes``, and ``search_stats`` by POI name.
+    """
+    target_idx = np.minimum(
+        np.searchsorted(graph.node_ids, target_nodes), graph.n_nodes - 1
+    )
+    # a target snapped beyond the halo cannot be routed in this tile
+    missing = graph.node_ids[target_idx] != target_nodes
+    session = RoutingSession(graph, target_idx=target_idx, backend=backend)
+    if len(boundary_idx):
+        to_boundary = session.distances(boundary_idx)[target_idx]
+    else:
+        to_boundary = np.full(len(target_idx), np.inf)
+
+    dists, flags, stats = {}, {}, {}
+    for name, node_ids in sources.items():
+        idx = np.searchsorted(
+            graph.node_ids, node_ids[np.isin(node_ids, graph.node_ids)]
+        )
+        if len(idx):
+            dist, _, stats[name] = session.search_targets(idx)
+        else:
+            dist = np.full(len(target_idx), np.inf)
+            stats[name] = {"sources": 0}
+        dists[name] = np.where(missing, np.inf, dist)
+        flags[name] = missing | (dist > to_boundary)
+    return dists, flags, stats
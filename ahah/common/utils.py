@@ -1,6 +1,13 @@
+import hashlib
+import os
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import polars as pl
+from pyproj import Transformer
+
+WGS84_TO_BNG = Transformer.from_crs("epsg:4326", "epsg:27700")
 
 
 class Paths:
@@ -8,8 +15,10 @@ class Paths:
     RAW = DATA / "raw"
     PROCESSED = DATA / "processed"
     OUT = DATA / "out"
+    METRICS = DATA / "metrics"
 
     OPROAD = PROCESSED / "oproad"
+    GRAPH = OPROAD / "graph"
 
 
 class Config:
@@ -29,13 +38,23 @@ class Config:
         "pharmacies": "edispensary.zip",
         "hospitals": "ets.zip",
     }
-    NHS_SCOT_URL = "https://www.opendata.nhs.scot/api/3/action/datastore_search"
+    # override to point at a local stand-in for the NHS Scotland CKAN API
+    NHS_SCOT_URL = os.environ.get(
+        "NHS_SCOT_URL", "https://www.opendata.nhs.scot/api/3/action/datastore_search"
+    )
     NHS_SCOT_FILES = {
         "gpp": "b3b126d3-3b0c-4856-b348-0b37f8286367",
         "dentists": "3e848c81-758d-4d64-87ee-0e2f147a7a81",
         "pharmacies": "https://www.opendata.nhs.scot/dataset/a30fde16-1226-49b3-b13d-eb90e39c2058/resource/bfbc492d-7318-4b3d-9f01-087491aafb38/download/dispenser_contactdetails_may_24.csv",
         "hospitals": "c698f450-eeed-41a0-88f7-c1e40a568acc",
     }
+    # POI type -> (code column, postcode column, code prefix) in the Scottish data
+    NHS_SCOT_COLUMNS = {
+        "gpp": ("PracticeCode", "Postcode", "c"),
+        "dentists": ("Dental_Practice_Code", "pc7", "c"),
+        "pharmacies": ("DispCode", "DispLocationPostcode", "c"),
+        "hospitals": ("HospitalCode", "Postcode", ""),
+    }
     NHS_WALES_URL = (
         "https://nwssp.nhs.wales/ourservices/"
         "primary-care-services/primary-care-services-documents/"
@@ -46,13 +65,24 @@ class Config:
             "/dispensing-data-report-november-2023"
         )
     }
+    NHS_WALES_COLUMNS = {"pharmacies": ("Account Number", "Post Code")}
+
+    # boundary files under Paths.RAW, mapped to the column holding the zone code
+    LSOA_BOUNDARIES = {
+        "gov/LSOA2021/LSOA_2021_EW_BFC_V8.shp": "LSOA21CD",
+        "gov/SG_DataZone/SG_DataZone_Bdry_2011.shp": "DataZone",
+    }
+    MSOA_BOUNDARIES = {
+        "gov/msoa-2011-bfc.gpkg": "MSOA11CD",
+        "gov/SG_IntermediateZone_Bdry_2011.shp": "InterZone",
+    }
 
 
 def clean_air(path: Path, col: str) -> pd.DataFrame:
     """
     Cleans air quality data by reading a CSV file, converting the specified column to numeric,
     and dropping rows with NaN values in that column.
-    
+
     :param path: Path to the CSV file.
     :param col: Column name to clean.
     :return: Cleaned DataFrame.
@@ -61,3 +91,79 @@ def clean_air(path: Path, col: str) -> pd.DataFrame:
     air[col] = pd.to_numeric(air[col], errors="coerce")
     air = air.dropna(subset=[col])
     return air
+
+
+def file_hash(path: Path) -> str:
+    """
+    Computes the MD5 digest of a file, matching the hashes DVC records.
+
+    :param path: Path to the file.
+    :return: Hex digest.
+    """
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "md5").hexdigest()
+
+
+def file_signature(path: Path, saved: dict | None = None) -> dict:
+    """
+    Records a file's size, modification time and MD5.
+
+    The MD5 is reused from ``saved`` when the size and modification time still
+    match it, so unchanged multi-GB files are not re-read.
+
+    :param path: Path to the file.
+    :param saved: Signature previously returned for the same file.
+    :return: Dict with ``md5``, ``size`` and ``mtime_ns``.
+    """
+    stat = path.stat()
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if (
+        isinstance(saved, dict)
+        and saved.get("size") == signature["size"]
+        and saved.get("mtime_ns") == signature["mtime_ns"]
+    ):
+        return {"md5": saved["md5"], **signature}
+    return {"md5": file_hash(path), **signature}
+
+
+def fmin_aligned(df: pd.DataFrame, other: pd.DataFrame) -> pd.DataFrame:
+    """
+    Takes the element-wise minimum of ``df`` and ``other`` over their shared
+    columns, aligning rows on the index of ``df``. Missing values are ignored
+    as in ``np.fmin``, so a value present in only one frame is kept.
+
+    Shared columns are always float64, whatever their dtype in ``df``, so the
+    ``sys.maxsize`` placeholder columns come back as floats.
+
+    :param df: DataFrame to update; its index and columns are preserved.
+    :param other: DataFrame of candidate lower values.
+    :return: Copy of ``df`` with shared columns replaced by the minimum.
+    """
+    shared = [col for col in df.columns if col in other.columns]
+    aligned = other.reindex(index=df.index, columns=shared)
+    out = df.copy()
+    out[shared] = np.fmin(
+        df[shared].to_numpy(dtype=np.float64), aligned.to_numpy(dtype=np.float64)
+    )
+    return out
+
+
+def to_bng(df: pl.DataFrame, lat: str = "lat", long: str = "long") -> pl.DataFrame:
+    """
+    Adds British National Grid ``easting`` and ``northing`` columns to a table of
+    WGS84 coordinates, passing whole columns to pyproj in one call. Rows with a
+    missing coordinate get null.
+
+    :param df: DataFrame with latitude and longitude columns.
+    :param lat: Latitude column.
+    :param long: Longitude column.
+    :return: ``df`` with float ``easting`` and ``northing`` columns.
+    """
+    missing = (df[lat].is_null() | df[long].is_null()).to_numpy()
+    easting, northing = WGS84_TO_BNG.transform(
+        df[lat].cast(pl.Float64).to_numpy(), df[long].cast(pl.Float64).to_numpy()
+    )
+    return df.with_columns(
+        pl.Series("easting", np.where(missing, np.nan, easting)).fill_nan(None),
+        pl.Series("northing", np.where(missing, np.nan, northing)).fill_nan(None),
+    )
@@ -0,0 +1,133 @@
+import json
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from ahah.common.utils import Paths, file_signature
+
+CHUNK_SIZE = 100_000
+# every worker holds its own copy of the boundaries, so memory grows with this
+WORKERS = 4
+
+
+def read_zones(boundaries: dict[str, str], zone_col: str) -> gpd.GeoDataFrame:
+    """
+    Reads and concatenates boundary files into one zone layer.
+
+    :param boundaries: Boundary paths under ``Paths.RAW`` mapped to their code
+        column, e.g. ``Config.LSOA_BOUNDARIES``.
+    :param zone_col: Name given to the zone code column.
+    :return: GeoDataFrame with ``zone_col`` and ``geometry``.
+    """
+    return pd.concat(
+        [
+            gpd.read_file(Paths.RAW / path)[[col, "geometry"]].rename(
+                columns={col: zone_col}
+            )
+            for path, col in boundaries.items()
+        ]
+    )
+
+
+def _source_files(path: Path) -> list[Path]:
+    # shapefiles are spread over sidecar files that all affect the geometry
+    if path.suffix == ".shp":
+        return sorted(path.parent.glob(f"{path.stem}.*"))
+    return [path]
+
+
+_worker_zones: gpd.GeoDataFrame | None = None
+_worker_zone_col: str | None = None
+
+
+def _init_worker(boundaries: dict[str, str], zone_col: str) -> None:
+    global _worker_zones, _worker_zone_col
+    _worker_zones = read_zones(boundaries, zone_col)
+    _worker_zone_col = zone_col
+    _ = _worker_zones.sindex  # build the spatial index before the first chunk
+
+
+def _join_chunk(
+    postcode: np.ndarray, easting: np.ndarray, northing: np.ndarray
+) -> pd.DataFrame:
+    points = gpd.GeoDataFrame(
+        {"postcode": postcode},
+        geometry=gpd.points_from_xy(easting, northing),
+        crs="EPSG:27700",
+    )
+    return gpd.sjoin(points, _worker_zones)[["postcode", _worker_zone_col]]
+
+
+def postcode_zone_lookup(
+    boundaries: dict[str, str],
+    zone_col: str,
+    outfile: Path,
+    postcodes_path: Path = Paths.PROCESSED / "onspd" / "all_postcodes.parquet",
+    chunk_size: int = CHUNK_SIZE,
+    workers: int = WORKERS,
+) -> pd.DataFrame:
+    """
+    Builds or reuses the postcode to zone lookup.
+
+    The lookup is rebuilt only when the MD5 of the postcode table or of any
+    boundary file differs from the manifest written alongside ``outfile``. As in
+    ``compile_graph``, files are only re-hashed when their size or modification
+    time changed.
+    Postcodes are point-in-polygon joined in chunks across a process pool, each
+    worker reading the boundaries and building the spatial index once.
+
+    :param boundaries: Boundary paths under ``Paths.RAW`` mapped to code column.
+    :param zone_col: Name of the zone code column in the output.
+    :param outfile: Lookup parquet path.
+    :param postcodes_path: Postcode table with ``easting`` and ``northing``.
+    :param chunk_size: Postcodes per sjoin task.
+    :param workers: Worker processes, each reading its own copy of the
+        boundaries.
+    :return: DataFrame with ``postcode`` and ``zone_col``.
+    """
+    sources = [postcodes_path] + [
+        file for path in boundaries for file in _source_files(Paths.RAW / path)
+    ]
+    manifest = outfile.with_suffix(".json")
+    saved = json.loads(manifest.read_text()) if manifest.exists() else {}
+    hashes = {str(path): file_signature(path, saved.get(str(path))) for path in sources}
+    if (
+        outfile.exists()
+        and saved.keys() == hashes.keys()
+        and all(
+            isinstance(saved[name], dict) and saved[name]["md5"] == entry["md5"]
+            for name, entry in hashes.items()
+        )
+    ):
+        if saved != hashes:
+            # touched but unchanged, recorded so the next run skips hashing
+            manifest.write_text(json.dumps(hashes, indent=2))
+        return pd.read_parquet(outfile)
+
+    pcs = pd.read_parquet(postcodes_path, columns=["postcode", "easting", "northing"])
+    chunks = [
+        pcs.iloc[start : start + chunk_size] for start in range(0, len(pcs), chunk_size)
+    ]
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(boundaries, zone_col),
+    ) as pool:
+        lookup = pd.concat(
+            pool.map(
+                _join_chunk,
+                [chunk["postcode"].to_numpy() for chunk in chunks],
+                [chunk["easting"].to_numpy() for chunk in chunks],
+                [chunk["northing"].to_numpy() for chunk in chunks],
+            ),
+            ignore_index=True,
+        )
+    manifest.unlink(missing_ok=True)
+    lookup.to_parquet(outfile, index=False)
+    manifest.write_text(json.dumps(hashes, indent=2))
+    return lookup
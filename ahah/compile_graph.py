@@ -0,0 +1,9 @@
+from ahah.common.graph import compile_graph
+from ahah.common.metrics import Metrics
+
+if __name__ == "__main__":
+    with Metrics("graph") as metrics:
+        with metrics.step("compile") as step:
+            graph, _ = compile_graph()
+            step.update(nodes=graph.n_nodes, edges=graph.n_edges)
+    print(f"Compiled road graph: {graph.n_nodes} nodes, {graph.n_edges} edges")
@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 from scipy.stats import norm
 
+from ahah.common.metrics import Metrics
 from ahah.common.utils import Paths
 
 
@@ -13,89 +14,180 @@ def exp_default(x, df):
     return norm.ppf((x - 0.5) / len(df))
 
 
-def process(idx, ahv: str):
-    low_dist = ["gp", "dent", "phar", "hosp", "leis"]
-    env_dist = ["gpas", "blue"]
-    air_qual = ["no2", "so2", "pm10"]
-    high_dist = ["gamb", "pubs", "tob", "ffood"]
-
-    all_dists = low_dist + env_dist + air_qual + high_dist
-    idx = idx.rename(columns={col: f"{ahv}{col}" for col in all_dists})
-
-    low_dist = [f"{ahv}{asset}" for asset in low_dist]
-    env_dist = [f"{ahv}{asset}" for asset in env_dist]
-    air_qual = [f"{ahv}{asset}" for asset in air_qual]
-    high_dist = [f"{ahv}{asset}" for asset in high_dist]
-
-    low_dist_ranked = [f"{asset}_rnk" for asset in low_dist]
-    env_dist_ranked = [f"{asset}_rnk" for asset in env_dist]
-    air_qual_ranked = [f"{asset}_rnk" for asset in air_qual]
-    high_dist_ranked = [f"{asset}_rnk" for asset in high_dist]
-
-    low_dist_expd = [f"{asset}_expd" for asset in low_dist]
-    env_dist_expd = [f"{asset}_expd" for asset in env_dist]
-    air_qual_expd = [f"{asset}_expd" for asset in air_qual]
-    high_dist_expd = [f"{asset}_expd" for asset in high_dist]
-
-    low_dist_pct = [f"{asset}_pct" for asset in low_dist]
-    env_dist_pct = [f"{asset}_pct" for asset in env_dist]
-    air_qual_pct = [f"{asset}_pct" for asset in air_qual]
-    high_dist_pct = [f"{asset}_pct" for asset in high_dist]
-
-    idx[low_dist_ranked] = idx[low_dist].rank(method="dense").astype(int)
-    idx[env_dist_ranked] = idx[env_dist].rank(method="min").astype(int)
-    idx[air_qual_ranked] = idx[air_qual].rank(method="min").astype(int)
-    idx[high_dist_ranked] = (
-        idx[high_dist].rank(method="min", ascending=False).astype(int)
+# domain -> (rank method, indicator -> ascending). Indicators ranked ascending are
+# better when low, e.g. drive time to a GP; passive greenspace is better high
+DOMAINS = {
+    "h": (
+        "dense",
+        {"gp": True, "dent": True, "phar": True, "hosp": True, "leis": True},
+    ),
+    "g": ("min", {"gpas": False, "blue": True}),
+    "e": ("min", {"no2": True, "so2": True, "pm10": True}),
+    "r": ("min", {"gamb": False, "pubs": False, "tob": False, "ffood": False}),
+}
+# order the domain exponentials are averaged in for the overall index
+INDEX_DOMAINS = ["r", "h", "g", "e"]
+
+
+def rank(values: np.ndarray, ascending: np.ndarray, dense: np.ndarray) -> np.ndarray:
+    """
+    Ranks every column of a 2-D array in one ``argsort`` pass, matching
+    ``DataFrame.rank`` with ``method="min"`` or ``method="dense"``.
+
+    :param values: Array of shape ``(rows, columns)``.
+    :param ascending: Per column, whether low values rank first.
+    :param dense: Per column, ``dense`` ranking instead of ``min``.
+    :return: Integer ranks starting at 1, same shape as ``values``.
+    """
+    # sort each column as a contiguous row; ties share a rank, so the sort need
+    # not be stable
+    signed = values.T * np.where(ascending, 1.0, -1.0)[:, None]
+    order = np.argsort(signed, axis=1)
+    ordered = np.take_along_axis(signed, order, axis=1)
+    starts = np.ones(ordered.shape, dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    position = np.arange(1, len(values) + 1)
+    ranks = np.maximum.accumulate(np.where(starts, position, 0), axis=1)
+    if dense.any():
+        ranks[dense] = np.cumsum(starts[dense], axis=1)
+    out = np.empty_like(ranks)
+    np.put_along_axis(out, order, ranks, axis=1)
+    return out.T
+
+
+def qcut_pct(ranks: np.ndarray, q: int = 100) -> np.ndarray:
+    """
+    Assigns every column of ranks to quantile bins, matching
+    ``pd.qcut(x, q, labels=False) + 1`` column by column.
+
+    Columns are offset into disjoint ranges so one ``searchsorted`` bins them
+    all.
+
+    :param ranks: Integer ranks of shape ``(rows, columns)``.
+    :param q: Number of quantile bins.
+    :return: Bin numbers from 1 to ``q``.
+    """
+    edges = np.percentile(ranks, np.linspace(0, 1, q + 1) * 100, axis=0)
+    if (np.diff(edges, axis=0) == 0).any():
+        raise ValueError("Bin edges must be unique")
+    offset = np.arange(ranks.shape[1]) * (ranks.max() + 1)
+    ids = np.searchsorted((edges + offset).T.ravel(), (ranks + offset).ravel("F"))
+    ids = ids.reshape(ranks.shape, order="F") - np.arange(ranks.shape[1]) * (q + 1)
+    ids[ranks == edges[0]] = 1
+    return ids
+
+
+def domain_scores(expd: np.ndarray, domains: dict = DOMAINS) -> np.ndarray:
+    """
+    Averages the indicator exponentials within each domain.
+
+    :param expd: Array of shape ``(rows, indicators)`` in ``domains`` order.
+    :param domains: Domain specification in the form of ``DOMAINS``.
+    :return: Array of shape ``(rows, domains)``.
+    """
+    bounds = np.cumsum([0] + [len(inds) for _, inds in domains.values()])
+    return np.column_stack(
+        [expd[:, start:end].mean(axis=1) for start, end in zip(bounds, bounds[1:])]
     )
 
-    # higher values for gspassive are better
-    idx[env_dist_ranked[0]] = (
-        idx[env_dist[0]].rank(method="min", ascending=False).astype(int)
+
+def index_columns(
+    idx: pd.DataFrame, ahv: str, domains: dict = DOMAINS
+) -> dict[str, np.ndarray]:
+    """
+    Computes every rank, exponential, percentile and domain column of one index
+    version from the raw indicator columns of ``idx``.
+
+    :param idx: DataFrame with one column per indicator in ``domains``.
+    :param ahv: Version prefix, e.g. ``ah4``.
+    :param domains: Domain specification in the form of ``DOMAINS``.
+    :return: New columns by name, in output order.
+    """
+    names = [f"{ahv}{ind}" for _, inds in domains.values() for ind in inds]
+    values = idx[[ind for _, inds in domains.values() for ind in inds]].to_numpy(
+        dtype=np.float64
+    )
+    ascending = np.array([asc for _, inds in domains.values() for asc in inds.values()])
+    dense = np.array(
+        [method == "dense" for method, inds in domains.values() for _ in inds]
     )
 
-    idx[low_dist_expd] = exp_default(idx[low_dist_ranked], idx)
-    idx[env_dist_expd] = exp_default(idx[env_dist_ranked], idx)
-    idx[air_qual_expd] = exp_default(idx[air_qual_ranked], idx)
-    idx[high_dist_expd] = exp_default(idx[high_dist_ranked], idx)
+    ranks = rank(values, ascending, dense)
+    expd = exp_default(ranks, idx)
+    pct = (ranks / ranks.max(axis=0) * 100).astype(int)
 
-    idx[low_dist_pct] = idx[low_dist_ranked].apply(
-        lambda x: (x / x.max() * 100).astype(int)
-    )
-    idx[env_dist_pct] = idx[env_dist_ranked].apply(
-        lambda x: (x / x.max() * 100).astype(int)
+    scores = domain_scores(expd, domains)
+    score_ranks = rank(
+        scores, np.ones(len(domains), bool), np.zeros(len(domains), bool)
     )
-    idx[air_qual_pct] = idx[air_qual_ranked].apply(
-        lambda x: (x / x.max() * 100).astype(int)
+    score_pct = qcut_pct(score_ranks)
+    score_expd = exp_trans(score_ranks, idx)
+
+    order = [list(domains).index(domain) for domain in INDEX_DOMAINS]
+    ahah = score_expd[:, order].mean(axis=1)
+    ahah_rnk = rank(ahah[:, None], np.array([True]), np.array([False]))
+
+    columns = {}
+    for suffix, matrix in [("_rnk", ranks), ("_expd", expd), ("_pct", pct)]:
+        columns.update(
+            {f"{name}{suffix}": matrix[:, i] for i, name in enumerate(names)}
+        )
+    for suffix, matrix in [("", scores), ("_rnk", score_ranks), ("_pct", score_pct)]:
+        columns.update(
+            {f"{ahv}{domain}{suffix}": matrix[:, i] for i, domain in enumerate(domains)}
+        )
+    columns.update(
+        {f"{domain}_expd": score_expd[:, i] for i, domain in enumerate(domains)}
     )
-    idx[high_dist_pct] = idx[high_dist_ranked].apply(
-        lambda x: (x / x.max() * 100).astype(int)
+    columns[f"{ahv}ahah"] = ahah
+    columns[f"{ahv}ahah_rnk"] = ahah_rnk[:, 0]
+    columns[f"{ahv}ahah_pct"] = qcut_pct(ahah_rnk)[:, 0]
+    return columns
+
+
+def process(idx: pd.DataFrame, ahv: str, domains: dict = DOMAINS) -> pd.DataFrame:
+    """
+    Builds one version of the index.
+
+    :param idx: DataFrame with one column per indicator in ``domains``.
+    :param ahv: Version prefix, e.g. ``ah4``.
+    :param domains: Domain specification in the form of ``DOMAINS``.
+    :return: ``idx`` with indicators prefixed by ``ahv`` and all index columns.
+    """
+    columns = index_columns(idx, ahv, domains)
+    idx = idx.rename(
+        columns={ind: f"{ahv}{ind}" for _, inds in domains.values() for ind in inds}
     )
-
-    idx[f"{ahv}h"] = idx[low_dist_expd].mean(axis=1)
-    idx[f"{ahv}g"] = idx[env_dist_expd].mean(axis=1)
-    idx[f"{ahv}e"] = idx[air_qual_expd].mean(axis=1)
-    idx[f"{ahv}r"] = idx[high_dist_expd].mean(axis=1)
-
-    idx[f"{ahv}h_rnk"] = idx[f"{ahv}h"].rank(method="min").astype(int)
-    idx[f"{ahv}g_rnk"] = idx[f"{ahv}g"].rank(method="min").astype(int)
-    idx[f"{ahv}e_rnk"] = idx[f"{ahv}e"].rank(method="min").astype(int)
-    idx[f"{ahv}r_rnk"] = idx[f"{ahv}r"].rank(method="min").astype(int)
-
-    idx[f"{ahv}h_pct"] = pd.qcut(idx[f"{ahv}h_rnk"], 100, labels=False) + 1
-    idx[f"{ahv}g_pct"] = pd.qcut(idx[f"{ahv}g_rnk"], 100, labels=False) + 1
-    idx[f"{ahv}e_pct"] = pd.qcut(idx[f"{ahv}e_rnk"], 100, labels=False) + 1
-    idx[f"{ahv}r_pct"] = pd.qcut(idx[f"{ahv}r_rnk"], 100, labels=False) + 1
-
-    idx["h_expd"] = exp_trans(idx[f"{ahv}h_rnk"], idx)
-    idx["g_expd"] = exp_trans(idx[f"{ahv}g_rnk"], idx)
-    idx["e_expd"] = exp_trans(idx[f"{ahv}e_rnk"], idx)
-    idx["r_expd"] = exp_trans(idx[f"{ahv}r_rnk"], idx)
-
-    idx[f"{ahv}ahah"] = idx[["r_expd", "h_expd", "g_expd", "e_expd"]].mean(axis=1)
-    idx[f"{ahv}ahah_rnk"] = idx[f"{ahv}ahah"].rank(method="min").astype(int)
-    idx[f"{ahv}ahah_pct"] = pd.qcut(idx[f"{ahv}ahah_rnk"], 100, labels=False) + 1
-    return idx
+    return pd.concat([idx, pd.DataFrame(columns, index=idx.index)], axis=1)
+
+
+def process_versions(idx: pd.DataFrame, versions: dict[str, dict]) -> pd.DataFrame:
+    """
+    Builds several index versions side by side from the same indicators.
+
+    Each version gets prefixed copies of its indicators and its own index
+    columns. The unprefixed domain exponentials are intermediate and left out,
+    since they would collide between versions.
+
+    :param idx: DataFrame with one column per indicator used by any version.
+    :param versions: Version prefix mapped to its domain specification.
+    :return: ``idx`` with every version's columns appended.
+    """
+    frames = [idx]
+    for ahv, domains in versions.items():
+        columns = index_columns(idx, ahv, domains)
+        indicators = {
+            f"{ahv}{ind}": idx[ind].to_numpy()
+            for _, inds in domains.values()
+            for ind in inds
+        }
+        columns = {
+            name: col
+            for name, col in columns.items()
+            if name.startswith(ahv) or not name.endswith("_expd")
+        }
+        frames.append(pd.DataFrame(indicators | columns, index=idx.index))
+    return pd.concat(frames, axis=1)
 
 
 if __name__ == "__main__":
@@ -120,7 +212,10 @@ if __name__ == "__main__":
             "pm102022g": "pm10",
         }
     ).ffill()
-    v4 = process(v4, ahv="ah4")
+    with Metrics("index") as metrics:
+        with metrics.step("process") as step:
+            v4 = process(v4, ahv="ah4")
+            step["rows"] = len(v4)
     v4 = v4[[c for c in v4.columns if not c.endswith("expd")]]
 
     v4.to_csv(Paths.OUT / "ahah" / "AHAH_V4.csv", index=False)
@@ -1,10 +1,7 @@
 import geopandas as gpd
 import polars as pl
-from pyproj import Transformer
 
-from ahah.common.utils import Paths
-
-transformer = Transformer.from_crs("epsg:4326", "epsg:27700")
+from ahah.common.utils import Paths, to_bng
 
 
 def process_pubs():
@@ -15,18 +12,7 @@ def process_pubs():
             columns=["FHRSID", "lat", "long"],
         )
         .drop_nulls()
-        .with_columns(
-            pl.struct(pl.col("lat"), pl.col("long"))
-            .map_elements(
-                lambda row: transformer.transform(row["lat"], row["long"]),
-                return_dtype=pl.List(pl.Float64),
-            )
-            .alias("coords")
-        )
-        .with_columns(
-            pl.col("coords").list[0].alias("easting"),
-            pl.col("coords").list[1].alias("northing"),
-        )
+        .pipe(to_bng)
         .select(["FHRSID", "easting", "northing"])
         .write_parquet("./data/processed/guardian/pubs.parquet")
     )
@@ -37,18 +23,7 @@ def process_cinemas():
         pl.read_csv(
             "./data/raw/guardian/cinemas.csv", columns=["full_address", "lat", "long"]
         )
-        .with_columns(
-            pl.struct(pl.col("lat"), pl.col("long"))
-            .map_elements(
-                lambda row: transformer.transform(row["lat"], row["long"]),
-                return_dtype=pl.List(pl.Float64),
-            )
-            .alias("coords")
-        )
-        .with_columns(
-            pl.col("coords").list[0].alias("easting"),
-            pl.col("coords").list[1].alias("northing"),
-        )
+        .pipe(to_bng)
         .select(["full_address", "easting", "northing"])
         .write_parquet("./data/processed/guardian/cinemas.parquet")
     )
@@ -59,18 +34,7 @@ def process_libraries():
         pl.read_csv(
             "./data/raw/guardian/libraries.csv", columns=["id", "Latitude", "Longitude"]
         )
-        .with_columns(
-            pl.struct(pl.col("Latitude"), pl.col("Longitude"))
-            .map_elements(
-                lambda row: transformer.transform(row["Latitude"], row["Longitude"]),
-                return_dtype=pl.List(pl.Float64),
-            )
-            .alias("coords")
-        )
-        .with_columns(
-            pl.col("coords").list[0].alias("easting"),
-            pl.col("coords").list[1].alias("northing"),
-        )
+        .pipe(to_bng, lat="Latitude", long="Longitude")
         .select(["id", "easting", "northing"])
         .write_parquet("./data/processed/guardian/libraries.parquet")
     )
@@ -82,18 +46,7 @@ def process_museums():
             "./data/raw/guardian/museums_galleries.csv",
             columns=["id", "latitude", "longitude"],
         )
-        .with_columns(
-            pl.struct(pl.col("latitude"), pl.col("longitude"))
-            .map_elements(
-                lambda row: transformer.transform(row["latitude"], row["longitude"]),
-                return_dtype=pl.List(pl.Float64),
-            )
-            .alias("coords")
-        )
-        .with_columns(
-            pl.col("coords").list[0].alias("easting"),
-            pl.col("coords").list[1].alias("northing"),
-        )
+        .pipe(to_bng, lat="latitude", long="longitude")
         .select(["id", "easting", "northing"])
         .write_parquet("./data/processed/guardian/museums.parquet")
     )
@@ -0,0 +1,36 @@
+import argparse
+
+from ahah.common.metrics import Metrics
+from ahah.common.utils import Config, Paths
+from ahah.common.zones import WORKERS, postcode_zone_lookup
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="sjoin worker processes, each holding its own copy of the boundaries",
+    )
+    args = parser.parse_args()
+
+    with Metrics("lookup") as metrics:
+        with metrics.step("sjoin/lsoa"):
+            postcode_zone_lookup(
+                Config.LSOA_BOUNDARIES,
+                "LSOA21CD",
+                Paths.PROCESSED / "onspd" / "postcode_lsoa.parquet",
+                workers=args.workers,
+            )
+        with metrics.step("sjoin/msoa"):
+            postcode_zone_lookup(
+                Config.MSOA_BOUNDARIES,
+                "MSOA11CD",
+                Paths.PROCESSED / "onspd" / "postcode_msoa.parquet",
+                workers=args.workers,
+            )
+
+
+if __name__ == "__main__":
+    main()
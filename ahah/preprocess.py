@@ -1,5 +1,5 @@
-import json
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
 from typing import IO
@@ -9,11 +9,12 @@ import geopandas as gpd
 import numpy as np
 import pandas as pd
 import polars as pl
-from pyproj import Transformer
 from shapely.geometry import MultiPolygon, Polygon
 from ukroutes.oproad.utils import process_oproad
 
-from ahah.common.utils import Config, Paths
+from ahah.common.ckan import fetch_records
+from ahah.common.metrics import Metrics
+from ahah.common.utils import Config, Paths, to_bng
 
 
 def _read_zip_from_url(filename: str) -> IO[bytes]:
@@ -25,58 +26,54 @@ def _read_zip_from_url(filename: str) -> IO[bytes]:
     return file.open(f"{Path(filename).stem}.csv")
 
 
-def _fetch_scot_records(resource_id: int, limit: int = 100) -> pl.DataFrame:
-    initial_url = f"{Config.NHS_SCOT_URL}?resource_id={resource_id}&limit={limit}"
-    response = urllib.request.urlopen(initial_url)
-    data = response.read().decode()
-    data_dict = json.loads(data)
-    total_records = data_dict["result"]["total"]
-    records = data_dict["result"]["records"]
-
-    offset = limit
-    while offset < total_records:
-        paginated_url = f"{Config.NHS_SCOT_URL}?resource_id={resource_id}&limit={limit}&offset={offset}"
-        response = urllib.request.urlopen(paginated_url)
-        data = response.read().decode()
-        data_dict = json.loads(data)
-        records.extend(data_dict["result"]["records"])
-        offset += limit
-    return pl.DataFrame(records)
-
-
 def process_postcodes():
+    """
+    Streams the ONSPD CSV into ``all_postcodes.parquet`` (current and terminated
+    postcodes) and ``postcodes.parquet`` (current only), plus the
+    ``postcode_ids.parquet`` dictionary.
+
+    Only the five needed columns are parsed and filters are pushed into the
+    scan, so the full directory is never held in memory. Both outputs are sorted
+    by postcode, with postcode stored as a categorical and coordinates as int32;
+    ``postcode_id`` is the row number in ``all_postcodes.parquet``.
+    """
     postcodes = (
-        pl.read_csv(
-            Paths.RAW / "onspd" / "ONSPD_FEB_2024.csv",
-            columns=["PCD", "OSEAST1M", "OSNRTH1M", "DOTERM", "CTRY"],
-        )
+        pl.scan_csv(Paths.RAW / "onspd" / "ONSPD_FEB_2024.csv")
+        .select(["PCD", "OSEAST1M", "OSNRTH1M", "DOTERM", "CTRY"])
         .rename({"PCD": "postcode", "OSEAST1M": "easting", "OSNRTH1M": "northing"})
-        .with_columns(pl.col("postcode").str.replace_all(" ", ""))
+        .filter(pl.col("CTRY").is_in(["N92000002", "L93000001", "M83000003"]).not_())
     )
 
-    (
-        postcodes.filter(
-            pl.col("CTRY").is_in(["N92000002", "L93000001", "M83000003"]).not_()
+    def sink(lf: pl.LazyFrame, path: Path) -> None:
+        (
+            lf.drop(["DOTERM", "CTRY"])
+            .drop_nulls()
+            .with_columns(pl.col("postcode").str.replace_all(" ", ""))
+            .sort("postcode")
+            .with_columns(
+                pl.col("postcode").cast(pl.Categorical),
+                pl.col("easting", "northing").cast(pl.Int32),
+            )
+            .sink_parquet(path)
         )
-        .drop(["DOTERM", "CTRY"])
-        .drop_nulls()
-        .write_parquet(Paths.PROCESSED / "onspd" / "all_postcodes.parquet")
+
+    sink(postcodes, Paths.PROCESSED / "onspd" / "all_postcodes.parquet")
+    sink(
+        postcodes.filter(pl.col("DOTERM").is_null()),
+        Paths.PROCESSED / "onspd" / "postcodes.parquet",
     )
     (
-        postcodes.filter(
-            (pl.col("DOTERM").is_null())
-            & (pl.col("CTRY").is_in(["N92000002", "L93000001", "M83000003"]).not_())
-        )
-        .drop(["DOTERM", "CTRY"])
-        .drop_nulls()
-        .write_parquet(Paths.PROCESSED / "onspd" / "postcodes.parquet")
+        pl.scan_parquet(Paths.PROCESSED / "onspd" / "all_postcodes.parquet")
+        .select(pl.col("postcode").cast(pl.String))
+        .with_row_index("postcode_id")
+        .select(["postcode", pl.col("postcode_id").cast(pl.Int32)])
+        .collect()
+        .write_parquet(Paths.PROCESSED / "onspd" / "postcode_ids.parquet")
     )
 
 
 def _welsh_hospitals():
     # view-source:https://111.wales.nhs.uk/localservices/?s=Hospital&pc=n&sort=default
-
-    transformer = Transformer.from_crs("epsg:4326", "epsg:27700")
     data = [
         [51.4133444539694, -3.28377486575934],
         [51.4138556369325, -3.28514814376831],
@@ -129,165 +126,109 @@ def _welsh_hospitals():
                 "lat": [row[0] for row in data],
             }
         )
-        .with_columns(
-            pl.struct(pl.col("lat"), pl.col("long"))
-            .map_elements(
-                lambda row: transformer.transform(row["lat"], row["long"]),
-                return_dtype=pl.List(pl.Float64),
-            )
-            .alias("coords")
-        )
-        .with_columns(
-            pl.col("coords").list[0].alias("easting").cast(pl.Int64),
-            pl.col("coords").list[1].alias("northing").cast(pl.Int64),
-        )
-        .select(["code", "easting", "northing"])
-    )
-
-
-def process_hospitals(postcodes):
-    eng_csv_path = Paths.RAW / "nhs" / "hospitals_england.csv"
-    if not eng_csv_path.exists():
-        eng_csv = _read_zip_from_url(Config.NHS_ENG_FILES["hospitals"])
-        (
-            pl.read_csv(eng_csv, has_header=False)
-            .select(["column_1", "column_10", "column_12"])
-            .rename({"column_1": "code", "column_10": "postcode", "column_12": "close"})
-            .filter(pl.col("close") == "")
-            .drop("close")
-            .write_csv(eng_csv_path)
-        )
-    eng = pl.read_csv(eng_csv_path)
-
-    scot_csv_path = Paths.RAW / "nhs" / "hospitals_scotland.csv"
-    if not scot_csv_path.exists():
-        (
-            _fetch_scot_records(Config.NHS_SCOT_FILES["hospitals"])
-            .select(["HospitalCode", "Postcode"])
-            .rename({"HospitalCode": "code", "Postcode": "postcode"})
-            .write_csv(scot_csv_path)
-        )
-    scot = pl.read_csv(scot_csv_path)
-    welsh = _welsh_hospitals()
-    pl.concat(
-        [
-            pl.concat([eng, scot])
-            .with_columns(pl.col("postcode").str.replace_all(" ", ""))
-            .join(postcodes, on="postcode")
-            .select(["code", "easting", "northing"]),
-            welsh,
-        ]
-    ).write_parquet(Paths.PROCESSED / "hospitals.parquet")
-
-
-def process_gpp(postcodes):
-    eng_csv_path = Paths.RAW / "nhs" / "gpp_england.csv"
-    if not eng_csv_path.exists():
-        eng_csv = _read_zip_from_url(Config.NHS_ENG_FILES["gpp"])
-        (
-            pl.read_csv(eng_csv, has_header=False)
-            .select(["column_1", "column_10", "column_12"])
-            .rename({"column_1": "code", "column_10": "postcode", "column_12": "close"})
-            .filter(pl.col("close") == "")
-            .drop("close")
-            .write_csv(eng_csv_path)
-        )
-    eng = pl.read_csv(eng_csv_path)
-
-    scot_csv_path = Paths.RAW / "nhs" / "gpp_scotland.csv"
-    if not scot_csv_path.exists():
-        (
-            _fetch_scot_records(Config.NHS_SCOT_FILES["gpp"])
-            .select(["PracticeCode", "Postcode"])
-            .rename({"PracticeCode": "code", "Postcode": "postcode"})
-            .with_columns(("c" + pl.col("code").cast(pl.String)).alias("code"))
-            .write_csv(scot_csv_path)
-        )
-    scot = pl.read_csv(scot_csv_path)
-    (
-        pl.concat([eng, scot])
-        .with_columns(pl.col("postcode").str.replace_all(" ", ""))
-        .join(postcodes, on="postcode")
+        .pipe(to_bng)
+        .with_columns(pl.col("easting", "northing").cast(pl.Int64))
         .select(["code", "easting", "northing"])
-        .write_parquet(Paths.PROCESSED / "gpp.parquet")
     )
 
 
-def process_dentists(postcodes):
-    eng_csv_path = Paths.RAW / "nhs" / "dentists_england.csv"
-    if not eng_csv_path.exists():
-        eng_csv = _read_zip_from_url(Config.NHS_ENG_FILES["dentists"])
+def _download_nhs(poi: str, nation: str, path: Path) -> None:
+    if nation == "england":
+        eng_csv = _read_zip_from_url(Config.NHS_ENG_FILES[poi])
         (
             pl.read_csv(eng_csv, has_header=False)
             .select(["column_1", "column_10", "column_12"])
             .rename({"column_1": "code", "column_10": "postcode", "column_12": "close"})
             .filter(pl.col("close") == "")
             .drop("close")
-            .write_csv(eng_csv_path)
-        )
-    eng = pl.read_csv(eng_csv_path)
-
-    scot_csv_path = Paths.RAW / "nhs" / "dentists_scotland.csv"
-    if not scot_csv_path.exists():
-        (
-            _fetch_scot_records(Config.NHS_SCOT_FILES["dentists"])
-            .select(["Dental_Practice_Code", "pc7"])
-            .rename({"Dental_Practice_Code": "code", "pc7": "postcode"})
-            .with_columns(("c" + pl.col("code").cast(pl.String)).alias("code"))
-            .write_csv(scot_csv_path)
+            .write_csv(path)
         )
-    scot = pl.read_csv(scot_csv_path)
-    (
-        pl.concat([eng, scot])
-        .with_columns(pl.col("postcode").str.replace_all(" ", ""))
-        .join(postcodes, on="postcode")
-        .select(["code", "easting", "northing"])
-        .write_parquet(Paths.PROCESSED / "dentists.parquet")
-    )
-
-
-def process_pharmacies(postcodes):
-    eng_csv_path = Paths.RAW / "nhs" / "pharmacies_england.csv"
-    if not eng_csv_path.exists():
-        eng_csv = _read_zip_from_url(Config.NHS_ENG_FILES["pharmacies"])
-        eng = (
-            pl.read_csv(eng_csv, has_header=False)
-            .select(["column_1", "column_10", "column_12"])
-            .rename({"column_1": "code", "column_10": "postcode", "column_12": "close"})
-            .filter(pl.col("close") == "")
-            .drop("close")
-            .write_csv(eng_csv_path)
+    elif nation == "scotland":
+        source = Config.NHS_SCOT_FILES[poi]
+        code, postcode, prefix = Config.NHS_SCOT_COLUMNS[poi]
+        records = (
+            pl.read_csv(source) if source.startswith("http") else fetch_records(source)
         )
-    eng = pl.read_csv(eng_csv_path)
-
-    scot_csv_path = Paths.RAW / "nhs" / "pharmacies_scotland.csv"
-    if not scot_csv_path.exists():
         (
-            pl.read_csv(Config.NHS_SCOT_FILES["pharmacies"])
-            .select(["DispCode", "DispLocationPostcode"])
-            .rename({"DispCode": "code", "DispLocationPostcode": "postcode"})
-            .with_columns(("c" + pl.col("code").cast(pl.String)).alias("code"))
-            .write_csv(scot_csv_path)
+            records.select([code, postcode])
+            .rename({code: "code", postcode: "postcode"})
+            .with_columns((prefix + pl.col("code").cast(pl.String)).alias("code"))
+            .write_csv(path)
         )
-    scot = pl.read_csv(scot_csv_path)
-
-    wales_csv_path = Paths.RAW / "nhs" / "pharmacies_wales.csv"
-    if not wales_csv_path.exists():
+    elif nation == "wales":
+        code, postcode = Config.NHS_WALES_COLUMNS[poi]
         (
-            pl.read_excel(Config.NHS_WALES_URL + Config.NHS_WALES_FILES["pharmacies"])
-            .select(["Account Number", "Post Code"])
-            .rename({"Account Number": "code", "Post Code": "postcode"})
-            .write_csv(wales_csv_path)
+            pl.read_excel(Config.NHS_WALES_URL + Config.NHS_WALES_FILES[poi])
+            .select([code, postcode])
+            .rename({code: "code", postcode: "postcode"})
+            .write_csv(path)
         )
-    wales = pl.read_csv(wales_csv_path)
-
-    (
-        pl.concat([eng, scot, wales])
-        .with_columns(pl.col("postcode").str.replace_all(" ", ""))
-        .join(postcodes, on="postcode")
-        .select(["code", "easting", "northing"])
-        .write_parquet(Paths.PROCESSED / "pharmacies.parquet")
+    else:
+        raise ValueError(f"Unknown NHS source: {nation}")
+
+
+def nhs_sources() -> dict[tuple[str, str], Path]:
+    """
+    Lists every national NHS source configured in ``Config``.
+
+    :return: ``(poi, nation)`` mapped to the cached raw CSV under ``data/raw/nhs``.
+    """
+    tables = {
+        "england": Config.NHS_ENG_FILES,
+        "scotland": Config.NHS_SCOT_FILES,
+        "wales": Config.NHS_WALES_FILES,
+    }
+    return {
+        (poi, nation): Paths.RAW / "nhs" / f"{poi}_{nation}.csv"
+        for nation, files in tables.items()
+        for poi in files
+    }
+
+
+def process_nhs(postcodes_path: Path, workers: int = 8) -> None:
+    """
+    Builds ``hospitals``, ``gpp``, ``dentists`` and ``pharmacies`` parquets from
+    every national NHS source in one lazy query.
+
+    Missing raw CSVs are downloaded concurrently. The cached CSVs are then
+    scanned, unioned with a ``poi`` column and joined to postcodes once for all
+    POI types. Welsh hospitals come with their own coordinates and are appended
+    after the join.
+
+    :param postcodes_path: Postcode table with ``postcode``, ``easting`` and
+        ``northing``.
+    :param workers: Maximum concurrent downloads.
+    """
+    sources = nhs_sources()
+    missing = [key for key, path in sources.items() if not path.exists()]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda key: _download_nhs(*key, sources[key]), missing))
+
+    schema = {"code": pl.String, "postcode": pl.String}
+    pois = pl.concat(
+        [
+            pl.scan_csv(path, schema_overrides=schema).with_columns(poi=pl.lit(poi))
+            for (poi, _), path in sources.items()
+        ]
     )
+    located = pl.concat(
+        [
+            pois.with_columns(pl.col("postcode").str.replace_all(" ", ""))
+            .join(
+                pl.scan_parquet(postcodes_path).with_columns(
+                    pl.col("postcode").cast(pl.String)
+                ),
+                on="postcode",
+            )
+            .select(["poi", "code", "easting", "northing"]),
+            _welsh_hospitals()
+            .lazy()
+            .select(pl.lit("hospitals").alias("poi"), "code", "easting", "northing"),
+        ],
+        how="vertical_relaxed",
+    ).collect()
+    for (poi,), df in located.partition_by("poi", as_dict=True).items():
+        df.drop("poi").write_parquet(Paths.PROCESSED / f"{poi}.parquet")
 
 
 def process_bluespace():
@@ -308,7 +249,9 @@ def process_bluespace():
         .drop_duplicates()
         .rename(columns={"x": "easting", "y": "northing"})
     )
-    bs.to_parquet(Paths.PROCESSED / "bluespace.parquet", index=False)
+    # every vertex, thinned into bluespace.parquet by ahah.thin_bluespace
+    (Paths.PROCESSED / "bluespace").mkdir(exist_ok=True)
+    bs.to_parquet(Paths.PROCESSED / "bluespace" / "vertices.parquet", index=False)
 
 
 def process_overture():
@@ -326,17 +269,17 @@ def process_overture():
 
 
 def main():
-    process_postcodes()
-    all_postcodes = pl.read_parquet(Paths.PROCESSED / "onspd" / "all_postcodes.parquet")
-
-    process_hospitals(all_postcodes)
-    process_gpp(all_postcodes)
-    process_dentists(all_postcodes)
-    process_pharmacies(all_postcodes)
-    process_bluespace()
-    process_overture()
-
-    _ = process_oproad(save=True)
+    with Metrics("preprocess") as metrics:
+        with metrics.step("onspd"):
+            process_postcodes()
+        with metrics.step("nhs"):
+            process_nhs(Paths.PROCESSED / "onspd" / "all_postcodes.parquet")
+        with metrics.step("bluespace"):
+            process_bluespace()
+        with metrics.step("overture"):
+            process_overture()
+        with metrics.step("oproad"):
+            _ = process_oproad(save=True)
 
 
 if __name__ == "__main__":
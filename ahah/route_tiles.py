@@ -0,0 +1,163 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from ahah.common.graph import compile_graph
+from ahah.common.metrics import Metrics
+from ahah.common.routing import BACKENDS, RoutingSession, snap_points
+from ahah.common.tiles import HALO, TILE_SIZE, plan_tiles, read_tile_graph, route_tile
+from ahah.common.utils import Paths
+
+TILES_DIR = Paths.OUT / "tiles"
+POSTCODES = Paths.PROCESSED / "onspd" / "postcode_nodes.parquet"
+
+
+def plan(tile_size: float, halo: float) -> None:
+    # POIs are snapped once against the full network, so a POI near a tile edge
+    # keeps the same road node in every tile that sees it
+    postcodes = pd.read_parquet(POSTCODES, columns=["easting", "northing"])
+    tiles = plan_tiles(postcodes, tile_size) | {"halo": halo}
+    graph, tree = compile_graph()
+    (TILES_DIR / "sources").mkdir(parents=True, exist_ok=True)
+    for file in Paths.PROCESSED.glob("*.parquet"):
+        source = pd.read_parquet(file).dropna(subset=["easting", "northing"])
+        np.save(
+            TILES_DIR / "sources" / f"{file.stem}.npy",
+            np.unique(snap_points(graph, tree, source)["node_id"].to_numpy()),
+        )
+    (TILES_DIR / "plan.json").write_text(json.dumps(tiles, indent=2))
+    print(f"{len(tiles['tiles'])} tiles of {tile_size:,.0f} m, halo {halo:,.0f} m")
+
+
+def run(key: str, halo: float | None, backend: str) -> None:
+    tiles = json.loads((TILES_DIR / "plan.json").read_text())
+    halo = tiles["halo"] if halo is None else halo
+    x0, y0, x1, y1 = tiles["tiles"][key]["bounds"]
+    sources = {
+        file.stem: np.load(file) for file in sorted(TILES_DIR.glob("sources/*.npy"))
+    }
+
+    with Metrics(f"tile_{key}", path=TILES_DIR / f"{key}.json") as metrics:
+        with metrics.step("load") as step:
+            postcodes = (
+                pl.scan_parquet(POSTCODES)
+                .with_row_index("postcode_idx")
+                .filter(
+                    (pl.col("easting") >= x0)
+                    & (pl.col("easting") < x1)
+                    & (pl.col("northing") >= y0)
+                    & (pl.col("northing") < y1)
+                )
+                .select("postcode_idx", "node_id")
+                .collect()
+            )
+            graph, boundary_idx = read_tile_graph(
+                Paths.OPROAD / "nodes.parquet",
+                Paths.OPROAD / "edges.parquet",
+                (x0, y0, x1, y1),
+                halo,
+            )
+            step.update(
+                halo=halo,
+                postcodes=len(postcodes),
+                nodes=graph.n_nodes,
+                boundary_nodes=len(boundary_idx),
+            )
+        with metrics.step("route"):
+            dists, flags, stats = route_tile(
+                graph,
+                boundary_idx,
+                postcodes["node_id"].to_numpy(),
+                sources,
+                backend=backend,
+            )
+        for name in sources:
+            metrics.record(
+                f"route/{name}", **stats[name], halo_affected=int(flags[name].sum())
+            )
+
+        out = {"postcode_idx": postcodes["postcode_idx"]}
+        for name in sources:
+            dist = dists[name].astype(np.float32)
+            out[name] = np.where(np.isinf(dist), np.nan, dist)
+            out[f"{name}_halo"] = flags[name]
+        pl.DataFrame(out).write_parquet(TILES_DIR / f"{key}.parquet")
+
+
+def merge() -> None:
+    tiles = json.loads((TILES_DIR / "plan.json").read_text())
+    missing = [
+        key for key in tiles["tiles"] if not (TILES_DIR / f"{key}.parquet").exists()
+    ]
+    if missing:
+        raise FileNotFoundError(f"Tiles not yet routed: {', '.join(missing)}")
+
+    postcodes = pd.read_parquet(POSTCODES)
+    graph, tree = compile_graph()
+    session = RoutingSession(graph, postcodes, tree=tree)
+    names = [file.stem for file in sorted(TILES_DIR.glob("sources/*.npy"))]
+    dists = {name: np.full(len(postcodes), np.nan, dtype=np.float32) for name in names}
+    flags = {name: np.zeros(len(postcodes), dtype=bool) for name in names}
+    affected = {}
+    for key in tiles["tiles"]:
+        tile = pl.read_parquet(TILES_DIR / f"{key}.parquet")
+        idx = tile["postcode_idx"].to_numpy()
+        for name in names:
+            dists[name][idx] = tile[name].to_numpy()
+            flags[name][idx] = tile[f"{name}_halo"].to_numpy()
+        affected[key] = sum(int(tile[f"{name}_halo"].sum()) for name in names)
+
+    for name in names:
+        session.write(
+            Paths.OUT / f"{name}_distances.parquet", {"time_weighted": dists[name]}
+        )
+    pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "postcode": postcodes["postcode"].to_numpy()[flags[name]],
+                    "poi": name,
+                    "time_weighted": dists[name][flags[name]],
+                }
+            )
+            for name in names
+        ],
+        ignore_index=True,
+    ).to_parquet(TILES_DIR / "halo_affected.parquet", index=False)
+    rerun = {key: count for key, count in affected.items() if count}
+    print(
+        f"merged {len(tiles['tiles'])} tiles, {sum(rerun.values()):,} postcode "
+        f"results possibly affected by the halo in {len(rerun)} tiles"
+    )
+    for key, count in sorted(rerun.items(), key=lambda item: -item[1]):
+        print(f"  {key}: {count:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    plan_parser = commands.add_parser("plan", help="split postcodes into tiles")
+    plan_parser.add_argument("--tile-size", type=float, default=TILE_SIZE)
+    plan_parser.add_argument("--halo", type=float, default=HALO)
+    run_parser = commands.add_parser("run", help="route one tile")
+    run_parser.add_argument("--tile", required=True)
+    run_parser.add_argument(
+        "--halo", type=float, help="override the planned halo, e.g. to rerun a tile"
+    )
+    run_parser.add_argument("--backend", choices=BACKENDS, default="scipy")
+    commands.add_parser("merge", help="combine routed tiles into distance outputs")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        plan(args.tile_size, args.halo)
+    elif args.command == "run":
+        run(args.tile, args.halo, args.backend)
+    else:
+        merge()
+
+
+if __name__ == "__main__":
+    main()
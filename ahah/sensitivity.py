@@ -0,0 +1,249 @@
+import argparse
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ahah.common.utils import Paths
+from ahah.create_index import (
+    DOMAINS,
+    INDEX_DOMAINS,
+    domain_scores,
+    exp_default,
+    exp_trans,
+    rank,
+)
+
+CHUNK_SIZE = 256
+CI = (2.5, 97.5)
+
+_worker_state: dict | None = None
+
+
+def indicator_expd(idx: pd.DataFrame, domains: dict = DOMAINS) -> np.ndarray:
+    """
+    Ranks every indicator once and applies the default exponential transform.
+
+    :param idx: DataFrame with one column per indicator in ``domains``.
+    :param domains: Domain specification in the form of ``DOMAINS``.
+    :return: Array of shape ``(rows, indicators)`` in ``domains`` order.
+    """
+    values = idx[[ind for _, inds in domains.values() for ind in inds]].to_numpy(
+        dtype=np.float64
+    )
+    ascending = np.array([asc for _, inds in domains.values() for asc in inds.values()])
+    dense = np.array(
+        [method == "dense" for method, inds in domains.values() for _ in inds]
+    )
+    return exp_default(rank(values, ascending, dense), idx)
+
+
+def _domain_matrix(indicator_weights: np.ndarray, domains: dict) -> np.ndarray:
+    # (scenarios, indicators) -> (indicators, scenarios * domains), each domain
+    # column averaging its own indicators with the scenario's weights
+    sizes = [len(inds) for _, inds in domains.values()]
+    member = np.repeat(np.eye(len(domains)), sizes, axis=0)
+    weighted = indicator_weights[:, :, None] * member[None]
+    totals = weighted.sum(axis=1, keepdims=True)
+    if (totals == 0).any():
+        raise ValueError("Every scenario must keep at least one indicator per domain")
+    return (weighted / totals).transpose(1, 0, 2).reshape(member.shape[0], -1)
+
+
+def _scenario_ranks(
+    domain_weights: np.ndarray,
+    indicator_weights: np.ndarray | None,
+    expd: np.ndarray,
+    domains: dict,
+    score_expd: np.ndarray | None,
+) -> np.ndarray:
+    n_rows, n_domains = len(expd), len(domains)
+    if indicator_weights is None:
+        combined = score_expd @ domain_weights.T
+    else:
+        scores = expd @ _domain_matrix(indicator_weights, domains)
+        score_ranks = rank(
+            scores,
+            np.ones(scores.shape[1], bool),
+            np.zeros(scores.shape[1], bool),
+        )
+        expd_scores = exp_trans(score_ranks, expd).reshape(n_rows, -1, n_domains)
+        combined = np.einsum("nkd,kd->nk", expd_scores, domain_weights)
+    ranks = rank(
+        combined, np.ones(combined.shape[1], bool), np.zeros(combined.shape[1], bool)
+    )
+    return ranks.astype(np.min_scalar_type(n_rows))
+
+
+def _init_worker(state: dict) -> None:
+    global _worker_state
+    _worker_state = state
+
+
+def _scenario_chunk(
+    domain_weights: np.ndarray, indicator_weights: np.ndarray | None
+) -> np.ndarray:
+    return _scenario_ranks(
+        domain_weights=domain_weights,
+        indicator_weights=indicator_weights,
+        **_worker_state,
+    )
+
+
+def scenario_ranks(
+    idx: pd.DataFrame,
+    domain_weights: np.ndarray,
+    indicator_weights: np.ndarray | None = None,
+    domains: dict = DOMAINS,
+    chunk_size: int = CHUNK_SIZE,
+    workers: int = 1,
+) -> np.ndarray:
+    """
+    Computes ``ahah_rnk`` under K alternative weightings of the index.
+
+    Indicators are ranked and transformed once. With domain weights alone the
+    domain exponentials are also fixed and each scenario is a single matrix
+    product. Indicator weights, where ``0`` drops an indicator, change the
+    domain scores, so those are re-ranked per scenario. Scenarios are evaluated
+    ``chunk_size`` at a time, across a process pool when ``workers`` is above
+    one. Equal domain weights with every indicator kept reproduce
+    ``process``, up to floating point ties.
+
+    :param idx: DataFrame with one column per indicator in ``domains``.
+    :param domain_weights: Array of shape ``(K, domains)`` in ``INDEX_DOMAINS``
+        order, normalised to sum to one per scenario.
+    :param indicator_weights: Optional array of shape ``(K, indicators)`` in
+        ``domains`` order.
+    :param domains: Domain specification in the form of ``DOMAINS``.
+    :param chunk_size: Scenarios per batch.
+    :param workers: Worker processes.
+    :return: Ranks of shape ``(rows, K)``, in the smallest unsigned integer type
+        that holds them.
+    """
+    domain_weights = np.asarray(domain_weights, dtype=np.float64)
+    domain_weights = domain_weights / domain_weights.sum(axis=1, keepdims=True)
+    # columns follow ``domains``, weights are given in ``INDEX_DOMAINS`` order
+    order = [INDEX_DOMAINS.index(domain) for domain in domains]
+    domain_weights = domain_weights[:, order]
+
+    expd = indicator_expd(idx, domains)
+    score_expd = None
+    if indicator_weights is None:
+        scores = domain_scores(expd, domains)
+        score_ranks = rank(
+            scores, np.ones(len(domains), bool), np.zeros(len(domains), bool)
+        )
+        score_expd = exp_trans(score_ranks, expd)
+    else:
+        indicator_weights = np.asarray(indicator_weights, dtype=np.float64)
+
+    starts = range(0, len(domain_weights), chunk_size)
+    chunks = [
+        (
+            domain_weights[start : start + chunk_size],
+            (
+                None
+                if indicator_weights is None
+                else indicator_weights[start : start + chunk_size]
+            ),
+        )
+        for start in starts
+    ]
+    state = {"expd": expd, "domains": domains, "score_expd": score_expd}
+    if workers <= 1:
+        return np.hstack([_scenario_ranks(dw, iw, **state) for dw, iw in chunks])
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(state,),
+    ) as pool:
+        return np.hstack(list(pool.map(_scenario_chunk, *zip(*chunks))))
+
+
+def rank_stability(ranks: np.ndarray, ci: tuple[float, float] = CI) -> pd.DataFrame:
+    """
+    Summarises how each area's ``ahah_rnk`` varies across scenarios.
+
+    :param ranks: Output of ``scenario_ranks``.
+    :param ci: Lower and upper percentiles of the interval.
+    :return: DataFrame with the interval bounds, median and standard deviation
+        of the rank, one row per area.
+    """
+    # blocks of rows, so the float copies percentile makes stay small
+    stats = np.vstack(
+        [
+            np.vstack(
+                [
+                    np.percentile(block, [ci[0], 50, ci[1]], axis=1),
+                    block.std(axis=1),
+                ]
+            ).T
+            for block in np.array_split(ranks, max(1, ranks.size // 2**24))
+        ]
+    )
+    return pd.DataFrame(
+        stats,
+        columns=["ahah_rnk_lower", "ahah_rnk_median", "ahah_rnk_upper", "ahah_rnk_std"],
+    )
+
+
+def sample_scenarios(
+    k: int,
+    domains: dict = DOMAINS,
+    dropout: float = 0.0,
+    seed: int | None = None,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Draws random scenarios for a Monte Carlo sweep.
+
+    Domain weights are uniform over the simplex. With ``dropout`` each
+    indicator is excluded with that probability, keeping at least one per
+    domain.
+
+    :param k: Number of scenarios.
+    :param domains: Domain specification in the form of ``DOMAINS``.
+    :param dropout: Probability of dropping each indicator.
+    :param seed: Random seed.
+    :return: Domain weights and indicator weights (``None`` without dropout).
+    """
+    rng = np.random.default_rng(seed)
+    domain_weights = rng.dirichlet(np.ones(len(domains)), size=k)
+    if dropout <= 0:
+        return domain_weights, None
+    blocks = []
+    for _, inds in domains.values():
+        keep = rng.random((k, len(inds))) >= dropout
+        # a domain left empty keeps one indicator at random
+        empty = ~keep.any(axis=1)
+        keep[empty, rng.integers(len(inds), size=empty.sum())] = True
+        blocks.append(keep)
+    return domain_weights, np.hstack(blocks).astype(np.float64)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", type=int, default=1000)
+    parser.add_argument("--dropout", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    idx = pd.read_csv(Paths.OUT / "ahah" / "AHAH_V4.csv")
+    idx = idx.rename(
+        columns={f"ah4{ind}": ind for _, inds in DOMAINS.values() for ind in inds}
+    )
+    domain_weights, indicator_weights = sample_scenarios(
+        args.scenarios, dropout=args.dropout, seed=args.seed
+    )
+    ranks = scenario_ranks(idx, domain_weights, indicator_weights, workers=args.workers)
+    stability = rank_stability(ranks)
+    stability.insert(0, "LSOA21CD", idx["LSOA21CD"].to_numpy())
+    stability["ah4ahah_rnk"] = idx["ah4ahah_rnk"].to_numpy()
+    stability.to_csv(Paths.OUT / "ahah" / "AHAH_V4_sensitivity.csv", index=False)
+
+
+if __name__ == "__main__":
+    main()
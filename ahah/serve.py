@@ -0,0 +1,115 @@
+import argparse
+import json
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import polars as pl
+
+from ahah.aggregate_lsoa import distance_files, read_dist_columns
+from ahah.common.store import AhahStore, build_store
+from ahah.common.utils import Paths
+
+HOST = "127.0.0.1"
+PORT = 8765
+# largest request body accepted, about 100k postcodes
+MAX_BODY = 2**21
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    """
+    Serves ``GET /lookup?postcode=L1 8JQ&postcode=...`` (repeated or comma
+    separated) and ``POST /lookup`` with a JSON body ``{"postcodes": [...]}``,
+    answering with a JSON list of ``AhahStore.records``.
+    """
+
+    store: AhahStore
+
+    def _respond(self, status: int, body) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/lookup":
+            self._respond(404, {"error": "not found"})
+            return
+        postcodes = [
+            postcode
+            for value in urllib.parse.parse_qs(url.query).get("postcode", [])
+            for postcode in value.split(",")
+        ]
+        self._respond(200, self.store.records(postcodes))
+
+    def do_POST(self) -> None:
+        if urllib.parse.urlsplit(self.path).path != "/lookup":
+            self._respond(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._respond(400, {"error": "invalid Content-Length"})
+            return
+        if length > MAX_BODY:
+            self._respond(413, {"error": "request too large"})
+            return
+        try:
+            postcodes = json.loads(self.rfile.read(length))["postcodes"]
+        except (ValueError, KeyError, TypeError):
+            self._respond(400, {"error": 'expected {"postcodes": [...]}'})
+            return
+        if not isinstance(postcodes, list):
+            self._respond(400, {"error": 'expected {"postcodes": [...]}'})
+            return
+        if not all(isinstance(postcode, str) for postcode in postcodes):
+            self._respond(400, {"error": "postcodes must be strings"})
+            return
+        self._respond(200, self.store.records(postcodes))
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def build(batched: bool = False) -> None:
+    ids = pl.read_parquet(Paths.PROCESSED / "onspd" / "postcode_ids.parquet")
+    build_store(
+        read_dist_columns(distance_files(batched=batched), ids),
+        ids,
+        pd.read_parquet(Paths.PROCESSED / "onspd" / "postcode_lsoa.parquet"),
+        pd.read_csv(Paths.OUT / "ahah" / "AHAH_V4.csv"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser(
+        "build", help="write the memory-mapped lookup store"
+    )
+    build_parser.add_argument(
+        "--batched",
+        action="store_true",
+        help="read the wide distances table written by route.py --batched",
+    )
+    serve_parser = commands.add_parser("serve", help="serve lookups over HTTP")
+    serve_parser.add_argument("--host", default=HOST)
+    serve_parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(batched=args.batched)
+        return
+    LookupHandler.store = AhahStore()
+    server = ThreadingHTTPServer((args.host, args.port), LookupHandler)
+    print(f"Serving AHAH lookups on http://{args.host}:{args.port}/lookup")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import pandas as pd
+
+from ahah.common.graph import compile_graph
+from ahah.common.metrics import Metrics
+from ahah.common.routing import snap_points
+from ahah.common.utils import Paths
+
+if __name__ == "__main__":
+    with Metrics("snap") as metrics:
+        with metrics.step("load"):
+            postcodes = pd.read_parquet(
+                Paths.PROCESSED / "onspd" / "all_postcodes.parquet"
+            )
+            graph, tree = compile_graph()
+        with metrics.step("snap") as step:
+            snap_points(graph, tree, postcodes).to_parquet(
+                Paths.PROCESSED / "onspd" / "postcode_nodes.parquet", index=False
+            )
+            step["postcodes"] = len(postcodes)
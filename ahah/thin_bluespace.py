@@ -0,0 +1,66 @@
+import argparse
+import json
+
+import pandas as pd
+
+from ahah.common.graph import compile_graph
+from ahah.common.metrics import Metrics
+from ahah.common.routing import (
+    SAMPLE_BBOX,
+    THIN_METHODS,
+    thin_sources,
+    thinning_error,
+)
+from ahah.common.utils import Paths
+
+# metres, cell size for --method grid
+GRID_SPACING = 50.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--method", choices=THIN_METHODS, default="node")
+    parser.add_argument("--spacing", type=float, default=GRID_SPACING)
+    parser.add_argument("--bbox", type=float, nargs=4, default=SAMPLE_BBOX)
+    args = parser.parse_args()
+
+    with Metrics("bluespace") as metrics:
+        with metrics.step("load"):
+            vertices = pd.read_parquet(
+                Paths.PROCESSED / "bluespace" / "vertices.parquet"
+            )
+            postcodes = pd.read_parquet(
+                Paths.PROCESSED / "onspd" / "all_postcodes.parquet"
+            )
+            graph, tree = compile_graph()
+
+        with metrics.step("thin"):
+            thinned = thin_sources(
+                vertices, args.method, spacing=args.spacing, graph=graph, tree=tree
+            )
+        with metrics.step("error"):
+            error = thinning_error(
+                graph, postcodes, vertices, thinned, bbox=tuple(args.bbox)
+            )
+    report = {
+        "method": args.method,
+        "spacing": args.spacing if args.method == "grid" else None,
+        "total_sources": len(vertices),
+        "total_thinned": len(thinned),
+        **error,
+    }
+    thinned[["easting", "northing"]].to_parquet(
+        Paths.PROCESSED / "bluespace.parquet", index=False
+    )
+    (Paths.PROCESSED / "bluespace" / "thinning.json").write_text(
+        json.dumps(report, indent=2)
+    )
+    print(
+        f"bluespace sources {len(vertices):,} -> {len(thinned):,} "
+        f"({1 - len(thinned) / len(vertices):.1%} fewer), sample max error "
+        f"{report['max_error']:.3g}, mean error {report['mean_error']:.3g}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import polars as pl
+import pytest
+
+from ahah.common.utils import Paths
+from ahah.guardian import aggregate_msoa
+
+POSTCODES = ["AB11AA", "AB12BB", "CD34CC", "EF56DD"]
+
+
+@pytest.fixture
+def guardian(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for path in [Paths.PROCESSED / "onspd", Paths.OUT / "guardian", Paths.OUT / "air"]:
+        path.mkdir(parents=True)
+    pl.DataFrame(
+        {"postcode": POSTCODES, "postcode_id": np.arange(4, dtype=np.int32)}
+    ).write_parquet(Paths.PROCESSED / "onspd" / "postcode_ids.parquet")
+    pd.DataFrame(
+        {"postcode": POSTCODES, "MSOA11CD": ["E1", "E1", "E2", "E2"]}
+    ).to_parquet(Paths.PROCESSED / "onspd" / "postcode_msoa.parquet", index=False)
+    pd.DataFrame({"MSOA11CD": ["E1", "E2"], "no2": [10.0, 20.0]}).to_csv(
+        Paths.OUT / "air" / "AIR-MSOA11CD.csv", index=False
+    )
+    # per-POI outputs, in a different postcode order from the dictionary
+    for name, times in {"gpp": [1.0, 3.0, 5.0, 9.0], "dentists": [2.0] * 4}.items():
+        pd.DataFrame({"postcode": POSTCODES[::-1], "time_weighted": times}).to_parquet(
+            Paths.OUT / "guardian" / f"{name}_distances.parquet", index=False
+        )
+    # a stale wide table from an earlier --batched run
+    pd.DataFrame({"postcode": POSTCODES, "stale": [0.0] * 4}).to_parquet(
+        Paths.OUT / "guardian" / "distances.parquet", index=False
+    )
+    return Paths.OUT / "guardian" / "DRIVETIME-MSOA11CD.csv"
+
+
+def test_msoa_reads_per_poi_files(guardian, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["aggregate_msoa"])
+    aggregate_msoa.main()
+    out = pd.read_csv(guardian)
+    assert sorted(out.columns) == ["MSOA11CD", "dentists", "gpp", "no2"]
+    # E1 holds AB11AA and AB12BB, the last two rows of the reversed outputs
+    assert out.set_index("MSOA11CD")["gpp"].to_dict() == {"E1": 7.0, "E2": 2.0}
+
+
+def test_msoa_reads_wide_table_when_batched(guardian, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["aggregate_msoa", "--batched"])
+    aggregate_msoa.main()
+    assert sorted(pd.read_csv(guardian).columns) == ["MSOA11CD", "no2", "stale"]
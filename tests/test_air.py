@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.interpolate import griddata
+from scipy.spatial import cKDTree
+
+from ahah.common.air import interpolate_grid, make_grid
+
+
+@pytest.fixture
+def airs() -> dict[str, pd.DataFrame]:
+    # jittered points so no four are cocircular, each pollutant missing a
+    # different scatter of cells and no2 a whole block
+    rng = np.random.default_rng(0)
+    x, y = (a.ravel() for a in np.meshgrid(np.arange(40), np.arange(30)))
+    base = pd.DataFrame(
+        {
+            "x": x * 1000 + 500 + rng.integers(-200, 200, x.size),
+            "y": y * 1000 + 500 + rng.integers(-200, 200, x.size),
+        }
+    )
+    out = {}
+    for i, col in enumerate(["no2", "so2", "pm10"]):
+        keep = rng.random(len(base)) > 0.05
+        if col == "no2":
+            keep &= ~(
+                base["x"].between(10_000, 20_000) & base["y"].between(5_000, 15_000)
+            )
+        air = base[keep].copy()
+        air[col] = np.sin(air["x"] / 7000) + np.cos(air["y"] / 5000) + i
+        out[col] = air
+    return out
+
+
+def alone(air: pd.DataFrame, col: str, xi: np.ndarray, method: str) -> np.ndarray:
+    points = air[["x", "y"]].to_numpy()
+    if method == "linear":
+        z = griddata(points, air[col].to_numpy(), xi, method="linear")
+    else:
+        dist, idx = cKDTree(points).query(xi, k=len(points))
+        # equidistant points resolve to the lowest row
+        z = air[col].to_numpy()[np.where(dist == dist[:, :1], idx, len(idx)).min(1)]
+    beyond = (xi[:, 0] >= air["x"].max()) | (xi[:, 1] >= air["y"].max())
+    return np.where(beyond, np.nan, z)
+
+
+@pytest.mark.parametrize("method", ["nearest", "linear"])
+def test_matches_interpolating_each_pollutant_alone(airs, method):
+    grid_x, grid_y = make_grid(list(airs.values()), 500)
+    xi = np.column_stack([grid_x, grid_y])
+    out = interpolate_grid(airs, grid_x, grid_y, method)
+    for col, air in airs.items():
+        np.testing.assert_allclose(out[col], alone(air, col, xi, method), atol=1e-12)
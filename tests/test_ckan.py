@@ -0,0 +1,86 @@
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ahah.common.ckan import fetch_records
+
+RECORDS = [{"_id": i, "Postcode": f"AB{i}"} for i in range(250)]
+
+
+class CkanHandler(BaseHTTPRequestHandler):
+    requests: list[dict] = []
+    version = "2024-01-01"
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        query = {
+            key: value[0] for key, value in urllib.parse.parse_qs(url.query).items()
+        }
+        if url.path.endswith("/resource_show"):
+            body = {"result": {"last_modified": self.version}}
+        else:
+            type(self).requests.append(query)
+            offset, limit = int(query["offset"]), int(query["limit"])
+            body = {
+                "result": {
+                    "total": len(RECORDS),
+                    "records": RECORDS[offset : offset + limit],
+                }
+            }
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def ckan():
+    CkanHandler.requests = []
+    CkanHandler.version = "2024-01-01"
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CkanHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/api/3/action/datastore_search"
+    server.shutdown()
+
+
+def fetch(base_url, cache_dir):
+    return fetch_records("res", base_url, page_size=40, workers=4, cache_dir=cache_dir)
+
+
+def test_fetches_every_page_in_order(ckan, tmp_path):
+    records = fetch(ckan, tmp_path)
+    assert records["_id"].to_list() == list(range(len(RECORDS)))
+    assert sorted(int(q["offset"]) for q in CkanHandler.requests) == list(
+        range(0, len(RECORDS), 40)
+    )
+
+
+def test_rerun_uses_cached_pages(ckan, tmp_path):
+    fetch(ckan, tmp_path)
+    CkanHandler.requests = []
+    assert len(fetch(ckan, tmp_path)) == len(RECORDS)
+    assert CkanHandler.requests == []
+
+
+def test_interrupted_run_resumes(ckan, tmp_path):
+    fetch(ckan, tmp_path)
+    (tmp_path / "res" / "80.json").unlink()
+    CkanHandler.requests = []
+    assert len(fetch(ckan, tmp_path)) == len(RECORDS)
+    assert [q["offset"] for q in CkanHandler.requests] == ["80"]
+
+
+def test_new_resource_version_refetches(ckan, tmp_path):
+    fetch(ckan, tmp_path)
+    CkanHandler.requests = []
+    CkanHandler.version = "2024-02-01"
+    fetch(ckan, tmp_path)
+    assert len(CkanHandler.requests) == len(range(0, len(RECORDS), 40))
@@ -0,0 +1,93 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ahah.bench import synthetic
+from ahah.common import poi_index
+from ahah.common.graph import RoadGraph, compile_graph
+from ahah.common.poi_index import PoiIndex
+from ahah.common.routing import RoutingSession
+
+
+@pytest.fixture
+def network(tmp_path):
+    nodes, edges = synthetic.road_graph(10_000, seed=3)
+    nodes.to_parquet(tmp_path / "nodes.parquet", index=False)
+    edges.to_parquet(tmp_path / "edges.parquet", index=False)
+    sources = {}
+    for name, poi in synthetic.pois(nodes, seed=3).items():
+        sources[name] = tmp_path / f"{name}.parquet"
+        poi.to_parquet(sources[name], index=False)
+    graph, tree = compile_graph(
+        tmp_path / "nodes.parquet", tmp_path / "edges.parquet", tmp_path / "graph"
+    )
+    return tmp_path, graph, tree, sources, synthetic.postcodes(nodes, seed=3)
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    # categories routed by PoiIndex.build, in order
+    calls = []
+    search = RoutingSession.search
+
+    def counted(self, source_idx):
+        calls.append(len(source_idx))
+        return search(self, source_idx)
+
+    monkeypatch.setattr(poi_index.RoutingSession, "search", counted)
+    return calls
+
+
+def test_query_matches_routing(network):
+    tmp, graph, tree, sources, postcodes = network
+    index = PoiIndex.build(sources, tmp / "index", graph=graph, tree=tree)
+    session = RoutingSession(graph, postcodes, backend="scipy", tree=tree)
+    for name, file in sources.items():
+        expected = session.route(pd.read_parquet(file))
+        out = index.query(postcodes, name)
+        np.testing.assert_allclose(
+            out["time_weighted"], expected["time_weighted"], rtol=1e-6
+        )
+        np.testing.assert_array_equal(out["nearest_poi"], expected["nearest_poi"])
+
+
+def test_cached_categories_match_recomputed(network, searches):
+    tmp, graph, tree, sources, postcodes = network
+    PoiIndex.build(sources, tmp / "index", graph=graph, tree=tree)
+    assert len(searches) == len(sources)
+
+    # only the changed category is routed again
+    gpp = pd.read_parquet(sources["gpp"]).iloc[::2]
+    gpp.to_parquet(sources["gpp"], index=False)
+    cached = PoiIndex.build(sources, tmp / "index", graph=graph, tree=tree)
+    assert len(searches) == len(sources) + 1
+
+    fresh = PoiIndex.build(sources, tmp / "fresh", graph=graph, tree=tree)
+    for name in sources:
+        a, b = cached.query(postcodes, name), fresh.query(postcodes, name)
+        np.testing.assert_array_equal(a["time_weighted"], b["time_weighted"])
+        np.testing.assert_array_equal(a["nearest_poi"], b["nearest_poi"])
+
+
+def test_missing_graph_key_never_matches(network, searches):
+    tmp, graph, tree, sources, _ = network
+    uncached = RoadGraph(
+        graph.node_ids, graph.coords, graph.indptr, graph.indices, graph.weights
+    )
+    assert graph.key is not None and uncached.key is None
+
+    PoiIndex.build(sources, tmp / "index", graph=uncached, tree=tree)
+    manifest = json.loads((tmp / "index" / "manifest.json").read_text())
+    assert manifest["graph"] is None
+    with pytest.raises(ValueError):
+        PoiIndex.open(tmp / "index", graph=uncached, tree=tree)
+    with pytest.raises(ValueError):
+        PoiIndex.open(tmp / "index", graph=graph, tree=tree)
+
+    # unchanged POI files are still rerouted, as neither build can be trusted
+    PoiIndex.build(sources, tmp / "index", graph=uncached, tree=tree)
+    PoiIndex.build(sources, tmp / "index", graph=graph, tree=tree)
+    assert len(searches) == 3 * len(sources)
+    PoiIndex.open(tmp / "index", graph=graph, tree=tree)
@@ -0,0 +1,53 @@
+import polars as pl
+import pytest
+
+pytest.importorskip("ukroutes")
+
+from ahah.common.utils import Paths  # noqa: E402
+from ahah.preprocess import process_postcodes  # noqa: E402
+
+ONSPD = """PCD,OSEAST1M,OSNRTH1M,DOTERM,CTRY
+ZZ1 2BB,400100,300100,,E92000001
+AA1 1AA,400000,300000,,E92000001
+BT1 1AA,300000,500000,,N92000002
+CF1 1AA,300200,200200,201001,W92000004
+JE2 3AB,,,,L93000001
+SW1A 1AA,,,,E92000001
+EH1 1AA,325000,673000,,S92000003
+"""
+
+
+@pytest.fixture
+def onspd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (Paths.RAW / "onspd").mkdir(parents=True)
+    (Paths.PROCESSED / "onspd").mkdir(parents=True)
+    (Paths.RAW / "onspd" / "ONSPD_FEB_2024.csv").write_text(ONSPD)
+    process_postcodes()
+    return Paths.PROCESSED / "onspd"
+
+
+def test_all_postcodes(onspd):
+    df = pl.read_parquet(onspd / "all_postcodes.parquet")
+    assert df.columns == ["postcode", "easting", "northing"]
+    assert df["postcode"].cast(pl.String).to_list() == [
+        "AA11AA",
+        "CF11AA",
+        "EH11AA",
+        "ZZ12BB",
+    ]
+    assert df.schema["postcode"] == pl.Categorical
+    assert df.schema["easting"] == df.schema["northing"] == pl.Int32
+
+
+def test_current_postcodes_drop_terminated(onspd):
+    df = pl.read_parquet(onspd / "postcodes.parquet")
+    assert df["postcode"].cast(pl.String).to_list() == ["AA11AA", "EH11AA", "ZZ12BB"]
+
+
+def test_postcode_ids_are_row_numbers(onspd):
+    ids = pl.read_parquet(onspd / "postcode_ids.parquet")
+    pcs = pl.read_parquet(onspd / "all_postcodes.parquet")
+    assert ids.schema == {"postcode": pl.String, "postcode_id": pl.Int32}
+    assert ids["postcode"].to_list() == pcs["postcode"].cast(pl.String).to_list()
+    assert ids["postcode_id"].to_list() == list(range(pcs.height))
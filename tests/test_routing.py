@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from ahah.bench import synthetic
+from ahah.common.graph import RoadGraph
+from ahah.common.routing import (
+    RoutingSession,
+    check_backends,
+    pruned_search,
+    thinning_error,
+)
+
+
+@pytest.fixture(scope="module")
+def network():
+    nodes, edges = synthetic.road_graph(10_000, seed=1)
+    return (
+        RoadGraph.from_frames(nodes, edges),
+        synthetic.postcodes(nodes, seed=1),
+        synthetic.pois(nodes, seed=1)["gpp"],
+    )
+
+
+def test_scipy_matches_networkx(network):
+    graph, postcodes, gpp = network
+    x, y = graph.coords[:, 0], graph.coords[:, 1]
+    bbox = (
+        np.quantile(x, 0.25),
+        np.quantile(y, 0.25),
+        np.quantile(x, 0.75),
+        np.quantile(y, 0.75),
+    )
+    assert check_backends(graph, postcodes, gpp, bbox) < 1e-6
+
+
+def test_thinning_error_within_region(network):
+    graph, postcodes, gpp = network
+    x, y = graph.coords[:, 0], graph.coords[:, 1]
+    bbox = (x.min(), y.min(), np.median(x), np.median(y))
+    inside = gpp["easting"].between(bbox[0], bbox[2]) & gpp["northing"].between(
+        bbox[1], bbox[3]
+    )
+
+    same = thinning_error(graph, postcodes, gpp, gpp, bbox)
+    assert same["sources"] == same["thinned"] == inside.sum()
+    assert same["max_error"] == same["changed"] == 0.0
+
+    # dropping every other source can only lengthen routes
+    fewer = thinning_error(graph, postcodes, gpp, gpp.iloc[::2], bbox)
+    assert fewer["thinned"] == inside.iloc[::2].sum()
+    assert fewer["max_error"] > 0.0
+
+
+def test_scipy_output_schema(network):
+    graph, postcodes, gpp = network
+    out = RoutingSession(graph, postcodes, backend="scipy").route(gpp)
+    # the scipy backend also records the nearest POI for incremental updates
+    assert list(out.columns) == [
+        "postcode",
+        "easting",
+        "northing",
+        "node_id",
+        "time_weighted",
+        "nearest_poi",
+    ]
+    assert len(out) == len(postcodes)
+
+
+def test_update_matches_full_search(network):
+    graph, _, _ = network
+    session = RoutingSession(graph, backend="scipy")
+    rng = np.random.default_rng(0)
+    sources = rng.choice(graph.n_nodes, 50, replace=False)
+    dist, nearest = session.search(sources)
+
+    changed = np.concatenate([sources[5:], rng.choice(graph.n_nodes, 5)])
+    updated, _ = session.update(dist, nearest, changed)
+    np.testing.assert_array_equal(updated, session.search(changed)[0])
+
+
+def test_pruned_search_stays_local(network):
+    graph, _, _ = network
+    session = RoutingSession(graph, backend="scipy")
+    sources = np.random.default_rng(0).choice(graph.n_nodes, 50, replace=False)
+    dist, nearest = session.search(sources)
+
+    added = np.array([0])
+    settled = pruned_search(graph, added, dist, nearest)
+    assert 0 < settled < graph.n_nodes / 10
+    np.testing.assert_array_equal(
+        dist, session.search(np.concatenate([sources, added]))[0]
+    )
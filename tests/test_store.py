@@ -0,0 +1,135 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import polars as pl
+import pytest
+
+from ahah.common.store import AhahStore, build_store
+from ahah.serve import LookupHandler
+
+POSTCODES = ["AB11AA", "AB12BB", "CD34CC", "EF56DD", "GH78EE"]
+
+
+@pytest.fixture(scope="module")
+def inputs(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("store")
+    ids = pl.DataFrame(
+        {"postcode": POSTCODES, "postcode_id": np.arange(5, dtype=np.int32)}
+    )
+    dists = pl.DataFrame(
+        {
+            "postcode_id": ids["postcode_id"],
+            "gpp": [1.5, 2.5, None, 4.5, 5.5],
+            "pharmacies": [0.5, 1.0, 1.5, 2.0, 2.5],
+        }
+    )
+    # GH78EE falls in no zone, E3 has no postcodes
+    zones = pd.DataFrame(
+        {"postcode": POSTCODES[:4], "LSOA21CD": ["E2", "E1", "E1", "W1"]}
+    )
+    pd.DataFrame(
+        {
+            "LSOA21CD": ["W1", "E1", "E2", "E3"],
+            "ah4ahah": [0.4, 0.1, 0.2, 0.3],
+            "ah4ahah_pct": [40, 10, 20, 30],
+            "label": ["d", "a", "b", "c"],
+        }
+    ).to_csv(tmp / "AHAH_V4.csv", index=False)
+    index = pd.read_csv(tmp / "AHAH_V4.csv")
+    build_store(dists, ids, zones, index, path=tmp / "store")
+    return AhahStore(tmp / "store"), dists, zones, index
+
+
+def test_lookup_matches_index_joined_through_zones(inputs):
+    store, dists, zones, index = inputs
+    expected = (
+        dists.to_pandas()
+        .assign(postcode=POSTCODES)
+        .merge(zones, on="postcode", how="left")
+        .merge(index, on="LSOA21CD", how="left")
+    )
+    out = store.lookup(POSTCODES[::-1])
+    expected = expected.iloc[::-1].reset_index(drop=True)
+
+    assert store.index_columns == ["ah4ahah", "ah4ahah_pct"]
+    assert out["found"].all()
+    assert list(out["LSOA21CD"]) == list(expected["LSOA21CD"].fillna(""))
+    for col in ["gpp", "pharmacies"]:
+        np.testing.assert_allclose(out[col], expected[col], rtol=1e-6)
+    for col in store.index_columns:
+        np.testing.assert_array_equal(out[col], expected[col].astype(float))
+
+
+def test_lookup_normalises_and_misses(inputs):
+    store, _, _, _ = inputs
+    out = store.lookup(["ab1 1aa", "ZZ99ZZ", "AB1"])
+    assert list(out["postcode"]) == ["AB11AA", "ZZ99ZZ", "AB1"]
+    assert list(out["found"]) == [True, False, False]
+    assert list(out["LSOA21CD"]) == ["E2", "", ""]
+    assert np.isnan(out["gpp"][1:]).all()
+    assert np.isnan(out["ah4ahah"][1:]).all()
+
+
+@pytest.fixture(scope="module")
+def server(inputs):
+    LookupHandler.store = inputs[0]
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LookupHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_port
+    server.shutdown()
+
+
+def post(port: int, body: bytes, length: str | None = None) -> tuple[int, object]:
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.putrequest("POST", "/lookup")
+    conn.putheader("Content-Length", str(len(body)) if length is None else length)
+    conn.endheaders(body)
+    response = conn.getresponse()
+    status, data = response.status, json.loads(response.read())
+    conn.close()
+    return status, data
+
+
+def test_post_lookup(server):
+    status, records = post(server, json.dumps({"postcodes": ["cd3 4cc"]}).encode())
+    assert status == 200
+    assert records[0]["postcode"] == "CD34CC"
+    assert records[0]["LSOA21CD"] == "E1"
+    assert records[0]["gpp"] is None
+
+
+def test_get_lookup(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+    conn.request("GET", "/lookup?postcode=AB1%201AA,GH78EE")
+    records = json.loads(conn.getresponse().read())
+    conn.close()
+    assert [record["found"] for record in records] == [True, True]
+    assert records[1]["LSOA21CD"] is None
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"postcodes": "AB11AA"},
+        {"postcodes": ["AB11AA", None]},
+        {"postcodes": [1]},
+        {"postcode": ["AB11AA"]},
+        ["AB11AA"],
+    ],
+)
+def test_post_rejects_bad_bodies(server, body):
+    status, data = post(server, json.dumps(body).encode())
+    assert status == 400
+    assert "error" in data
+
+
+@pytest.mark.parametrize("length", ["abc", "-1"])
+def test_post_rejects_bad_content_length(server, length):
+    status, data = post(server, b"", length=length)
+    assert status == 400
+    assert data == {"error": "invalid Content-Length"}
@@ -0,0 +1,39 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+from ahah.bench import synthetic
+from ahah.common.utils import clean_air
+
+
+@pytest.mark.parametrize("kind", ["grid", "planar"])
+def test_road_graph_schema(kind):
+    nodes, edges = synthetic.road_graph(10_000, kind=kind)
+    assert list(nodes.columns) == ["node_id", "easting", "northing"]
+    assert list(edges.columns) == ["start_node", "end_node", "time_weighted"]
+    assert nodes["node_id"].is_unique
+    assert edges["start_node"].isin(nodes["node_id"]).all()
+    assert edges["end_node"].isin(nodes["node_id"]).all()
+    assert (edges["time_weighted"] > 0).all()
+
+
+def test_fixtures(tmp_path):
+    synthetic.write_fixtures("10k", tmp_path)
+    pcs = pd.read_parquet(tmp_path / "all_postcodes.parquet")
+    zones = gpd.read_file(tmp_path / "zones.gpkg")
+    points = gpd.GeoDataFrame(
+        pcs, geometry=gpd.points_from_xy(pcs["easting"], pcs["northing"]), crs=27700
+    )
+    # every postcode falls in exactly one zone
+    joined = points.sjoin(zones, predicate="within")
+    assert joined.index.is_unique and len(joined) == len(pcs)
+
+    assert {file.stem for file in (tmp_path / "poi").glob("*.parquet")} == set(
+        synthetic.POI_DENSITY
+    )
+    for col in synthetic.POLLUTANTS:
+        raw = pd.read_csv(tmp_path / "air" / f"{col}.csv", skiprows=5)
+        air = clean_air(tmp_path / "air" / f"{col}.csv", col)
+        assert 0 < len(air) < len(raw)
+        assert np.issubdtype(air[col].dtype, np.floating)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from scipy.spatial import cKDTree
+
+from ahah.bench import synthetic
+from ahah.common.graph import RoadGraph
+from ahah.common.routing import RoutingSession, snap_points
+from ahah.common.tiles import plan_tiles, read_tile_graph, route_tile
+
+
+@pytest.fixture(scope="module")
+def network(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("tiles")
+    nodes, edges = synthetic.road_graph(10_000, seed=2)
+    nodes.to_parquet(tmp / "nodes.parquet", index=False)
+    edges.to_parquet(tmp / "edges.parquet", index=False)
+    graph = RoadGraph.from_frames(nodes, edges)
+    tree = cKDTree(graph.coords)
+    postcodes = snap_points(graph, tree, synthetic.postcodes(nodes, seed=2))
+    sources = {
+        name: np.unique(snap_points(graph, tree, poi)["node_id"].to_numpy())
+        for name, poi in synthetic.pois(nodes, seed=2).items()
+    }
+    return tmp, graph, postcodes, sources
+
+
+@pytest.mark.parametrize("halo", [500.0, 2_000.0])
+def test_tiles_match_full_routing(network, halo):
+    tmp, graph, postcodes, sources = network
+    session = RoutingSession(graph, postcodes, backend="scipy")
+    full = {
+        name: session.distances(np.searchsorted(graph.node_ids, node_ids))[
+            session.target_idx
+        ]
+        for name, node_ids in sources.items()
+    }
+
+    tiles = plan_tiles(postcodes, tile_size=2_500.0)
+    x, y = postcodes["easting"].to_numpy(), postcodes["northing"].to_numpy()
+    exact = 0
+    for tile in tiles["tiles"].values():
+        x0, y0, x1, y1 = tile["bounds"]
+        inside = (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+        tile_graph, boundary_idx = read_tile_graph(
+            tmp / "nodes.parquet", tmp / "edges.parquet", tile["bounds"], halo
+        )
+        dists, flags, _ = route_tile(
+            tile_graph,
+            boundary_idx,
+            postcodes["node_id"].to_numpy()[inside],
+            sources,
+        )
+        for name, dist in dists.items():
+            expected = full[name][inside]
+            # unflagged results are exact; a tile only drops roads, so flagged
+            # ones can only be longer
+            np.testing.assert_allclose(dist[~flags[name]], expected[~flags[name]])
+            assert (dist[flags[name]] >= expected[flags[name]] - 1e-9).all()
+            exact += int((~flags[name]).sum())
+    assert exact > 0
@@ -0,0 +1,102 @@
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ahah.common.utils import fmin_aligned
+
+
+def combine_loop(merged_df: pd.DataFrame, ldc: pd.DataFrame) -> pd.DataFrame:
+    # the per-element merge aggregate_lsoa.read_dists used before fmin_aligned
+    merged_df = merged_df.copy()
+
+    def compare_and_replace(x, y):
+        return y if pd.notna(y) and (pd.isna(x) or y < x) else x
+
+    for column in merged_df.columns:
+        if column == "LSOA21CD":
+            continue
+        if column in ldc.columns:
+            with warnings.catch_warnings():
+                # pandas 2 tries, and fails, to cast NaN results back to int64
+                warnings.simplefilter("ignore", RuntimeWarning)
+                merged_df[column] = merged_df[column].combine(
+                    ldc[column], compare_and_replace
+                )
+    return merged_df
+
+
+def lsoas(*codes: str) -> pd.Index:
+    return pd.Index(list(codes), name="LSOA21CD")
+
+
+@pytest.fixture
+def merged() -> pd.DataFrame:
+    df = pd.DataFrame(
+        {
+            "gpp": [1.0, np.nan, 3.0, np.nan, 5.0],
+            "pharmacies": [2.0, 2.0, np.nan, 4.0, 1.0],
+            "ndvi": [0.1, 0.2, 0.3, 0.4, 0.5],
+        },
+        index=lsoas("E1", "E2", "E3", "E4", "W1"),
+    )
+    df["tobacconists"] = sys.maxsize
+    df["gambling"] = sys.maxsize
+    return df
+
+
+def assert_matches_loop(df: pd.DataFrame, other: pd.DataFrame) -> None:
+    # the loop's dtypes depend on the pandas version; fmin_aligned's do not
+    out = fmin_aligned(df, other)
+    shared = [col for col in df.columns if col in other.columns]
+    assert (out[shared].dtypes == np.float64).all()
+    pd.testing.assert_frame_equal(out, combine_loop(df, other), check_dtype=False)
+
+
+def test_nans_on_either_side(merged):
+    ldc = pd.DataFrame(
+        {
+            "gpp": [0.5, 2.0, np.nan, np.nan, 6.0],
+            "pharmacies": [np.nan, 1.0, 3.0, 5.0, np.nan],
+            "tobacconists": [1.5, np.nan, 2.0, 3.0, 4.0],
+            "gambling": [9.0, 8.0, np.nan, 7.0, 6.0],
+        },
+        index=merged.index,
+    )
+    assert_matches_loop(merged, ldc)
+
+
+def test_lsoas_in_one_frame_only(merged):
+    ldc = pd.DataFrame(
+        {
+            "gpp": [0.5, 2.0, 7.0],
+            "pharmacies": [3.0, np.nan, 1.0],
+            "tobacconists": [1.0, 2.0, 3.0],
+            "gambling": [np.nan, 4.0, 5.0],
+        },
+        index=lsoas("E3", "E2", "E9"),
+    )
+    assert_matches_loop(merged, ldc)
+
+
+@pytest.mark.parametrize(
+    "gambling", [[np.nan] * 5, [np.inf] * 5, [1.0, np.nan, np.nan, np.nan, np.nan]]
+)
+def test_maxsize_columns_become_float(merged, gambling):
+    ldc = pd.DataFrame(
+        {"tobacconists": [1.0, 2.0, 3.0, 4.0, 5.0], "gambling": gambling},
+        index=merged.index,
+    )
+    out = fmin_aligned(merged, ldc)
+    assert out["gambling"].dtype == np.float64
+    assert (out.loc[["E2", "E3"], "gambling"] == float(sys.maxsize)).all()
+    assert_matches_loop(merged, ldc)
+
+
+def test_columns_not_in_ldc_are_untouched(merged):
+    ldc = pd.DataFrame({"gpp": [0.0]}, index=lsoas("W1"))
+    out = fmin_aligned(merged, ldc)
+    pd.testing.assert_frame_equal(out.drop(columns="gpp"), merged.drop(columns="gpp"))
+    assert_matches_loop(merged, ldc)